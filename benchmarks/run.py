@@ -0,0 +1,156 @@
+"""
+Benchmarks of the analysis pipeline on synthetic histories (see benchmarks/synthetic.py).
+
+Run from the root of the repository, e.g.
+
+    python -m benchmarks.run --scales small medium --repeat 3 --json_fn bench.jsonl
+
+Each stage is timed over --repeat runs (the fastest run is reported) and then run once more
+under tracemalloc to get the peak memory it allocates. The stages of ConflictManager.calculate()
+are also reported one by one: wall time of its last untraced run, and peak memory of the traced
+run (what each allocated above the memory in use when it started).
+"""
+import argparse
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_history, SyntheticWikipediaDV
+from metrics.conflict import ConflictManager
+from metrics.ownership import OwnershipManager
+from metrics.token import TokensManager
+from visualization.actions_listener import ActionsListener
+from visualization.editors_listener import EditorsListener
+
+
+# Sizes of the synthetic articles: tokens, revisions and editors.
+SCALES = {
+    'small': dict(n_tokens=10000, n_revisions=1000, n_editors=50),
+    'medium': dict(n_tokens=100000, n_revisions=5000, n_editors=300),
+    'large': dict(n_tokens=500000, n_revisions=20000, n_editors=1500),
+}
+
+
+def get_stages(all_content, revisions, lng):
+    """
+    The stages of the pipeline, in the order of the notebooks. Each stage is a function of the
+    outputs of the previous ones (kept in state) and returns the rows it produced.
+    """
+    def conflict_manager(state):
+        manager = ConflictManager(all_content.copy(), revisions.copy(), lng=lng, include_stopwords=True)
+        manager.calculate(verbose=False)
+        state['manager'] = manager
+        if tracemalloc.is_tracing():
+            state['traced_spans'] = manager.profiler.spans
+            # The spans reset the peak of tracemalloc, measure() reads the peak from here too.
+            state['traced_peak'] = manager.profiler.traced_peak
+        else:
+            state['spans'] = manager.profiler.spans
+        state['sources'] = manager.source
+        state['sources']['wiki_dv'] = SyntheticWikipediaDV()
+        return len(manager.all_actions)
+
+    def tokens_manager(state):
+        adds, dels, reins = TokensManager(state['manager'].all_actions).token_survive()
+        return len(adds) + len(dels) + len(reins)
+
+    def actions_listener(state):
+        listener = ActionsListener(sources=state['sources'], lng=lng)
+        listener.get_main()
+        state['agg_actions'] = listener.df
+        return len(listener.df)
+
+    def editors_listener(state):
+        listener = EditorsListener(state['agg_actions'], state['sources'], lng)
+        listener.get_infos()
+        return len(listener.conflict_graph)
+
+    def ownership(state):
+        all_actions = state['manager'].all_actions
+        owners = OwnershipManager(all_actions)
+        dates = pd.date_range(owners.times[0], owners.times[-1], freq='D').values
+        return len(owners.get_owned_history(dates))
+
+    return [('ConflictManager.calculate', conflict_manager),
+            ('TokensManager.token_survive', tokens_manager),
+            ('ActionsListener.get_main', actions_listener),
+            ('EditorsListener.get_infos', editors_listener),
+            ('OwnershipManager.get_owned_history', ownership)]
+
+
+def measure(stage, state, repeat):
+    """Fastest wall time of repeat runs, and the peak memory of one more run under tracemalloc."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        rows = stage(state)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    stage(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak = max(peak, state.pop('traced_peak', 0))
+
+    return rows, min(times), peak / 2**20
+
+
+def run_scale(scale, params, repeat, lng='en', seed=0):
+    """
+    Benchmark every stage on one synthetic article.
+    ...
+    Returns:
+    --------
+    records (list): one dict per stage and per stage of ConflictManager.calculate().
+    """
+    all_content, revisions = make_history(lng=lng, seed=seed, **params)
+    context = {'scale': scale, **params, 'content_rows': len(all_content),
+               'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__}
+
+    records = []
+    state = {}
+    for name, stage in get_stages(all_content, revisions, lng):
+        rows, wall, peak = measure(stage, state, repeat)
+        records.append({**context, 'stage': name, 'rows': rows, 'wall_s': wall, 'peak_mb': peak})
+
+        if name == 'ConflictManager.calculate':
+            for span, traced in zip(state['spans'], state['traced_spans']):
+                records.append({**context, 'stage': f"{name}.{span['stage']}", 'rows': span['rows'],
+                                'wall_s': span['wall_s'], 'peak_mb': traced['peak_traced_mb']})
+
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--revert_rate', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json_fn', default=None, help='JSON lines file the results are appended to.')
+    args = parser.parse_args()
+
+    records = []
+    for scale in args.scales:
+        params = {**SCALES[scale], 'revert_rate': args.revert_rate}
+        records.extend(run_scale(scale, params, args.repeat, seed=args.seed))
+
+    if args.json_fn is not None:
+        with open(args.json_fn, 'a', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+
+    report = pd.DataFrame(records)
+    print(report.pivot_table(index='stage', columns='scale', values=['wall_s', 'peak_mb'])
+          .round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
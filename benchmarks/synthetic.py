@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+def make_history(n_tokens=10000, n_revisions=1000, n_editors=50, revert_rate=0.3, revert_gap=5,
+                 anonymous_rate=0.2, stopword_rate=0.4, lng='en', seed=0):
+    """
+    Synthetic article history in the shape of the WikiWho API (all_content and revisions), built
+    with array operations so that large histories take seconds.
+    ...
+    Parameters:
+    -----------
+    n_tokens (int): number of tokens of the article.
+    n_revisions (int): number of revisions.
+    n_editors (int): number of registered editors; a few editors make most of the revisions.
+    revert_rate (float): probability that a token is deleted (or reinserted) once more after each
+                of its actions, i.e. a token has revert_rate / (1 - revert_rate) changes on
+                average after its first insertion.
+    revert_gap (int): mean number of revisions between two changes of the same token.
+    anonymous_rate (float): share of the revisions made by unregistered (IP) editors.
+    stopword_rate (float): share of the tokens that are stop words.
+    lng (str): language of the stop word list.
+    seed (int): seed of the random generator, the same parameters give the same history.
+    ...
+    Returns:
+    --------
+    all_content (pd.DataFrame): |page_id|o_rev_id|token|token_id|o_editor|in|out|article_title|
+    revisions (pd.DataFrame): |rev_id|rev_time|o_editor|
+    """
+    rng = np.random.default_rng(seed)
+
+    # Revisions: a few hours to a few days apart, by editors chosen with a heavy tail.
+    rev_ids = np.arange(1, n_revisions + 1) * 10
+    gaps = rng.exponential(86400, n_revisions).astype('int64')
+    rev_time = pd.Timestamp('2005-01-01', tz='UTC') + pd.to_timedelta(np.cumsum(gaps), unit='s')
+    editors = (rng.zipf(1.5, n_revisions) - 1) % n_editors + 1
+    rev_editor = editors.astype(str).astype(object)
+    anonymous = rng.random(n_revisions) < anonymous_rate
+    rev_editor[anonymous] = ['0|10.0.%d.%d' % (i // 256 % 256, i % 256)
+                             for i in rng.integers(0, 2**16, anonymous.sum())]
+    revisions = pd.DataFrame({'rev_id': rev_ids, 'rev_time': rev_time, 'o_editor': rev_editor})
+
+    # Tokens: the revision that first inserted them and the revisions that changed them later.
+    origin = rng.integers(0, n_revisions, n_tokens)
+    n_changes = rng.geometric(1 - revert_rate, n_tokens) - 1
+    token_of_change = np.repeat(np.arange(n_tokens), n_changes)
+    steps = rng.geometric(1 / max(revert_gap, 1), len(token_of_change))
+    starts = np.cumsum(n_changes) - n_changes
+    cumulative = np.concatenate([[0], np.cumsum(steps)])
+    position = origin[token_of_change] + cumulative[1:] - np.repeat(cumulative[starts], n_changes)
+
+    # Changes past the last revision never happened.
+    happened = position < n_revisions
+    token_of_change, position = token_of_change[happened], position[happened]
+    n_changes = np.bincount(token_of_change, minlength=n_tokens)
+
+    # Changes alternate deletion, reinsertion, deletion... one row per insertion and its deletion.
+    n_rows = n_changes // 2 + 1
+    token_of_row = np.repeat(np.arange(n_tokens), n_rows)
+    row = np.arange(len(token_of_row)) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+    first_change = np.repeat(np.cumsum(n_changes) - n_changes, n_rows)
+    ins = np.full(len(row), -1)
+    outs = np.full(len(row), -1)
+    reinserted = row > 0
+    ins[reinserted] = rev_ids[position[first_change[reinserted] + 2 * row[reinserted] - 1]]
+    deleted = 2 * row < n_changes[token_of_row]
+    outs[deleted] = rev_ids[position[first_change[deleted] + 2 * row[deleted]]]
+
+    # Strings: stop words and content words, both with a heavy tail.
+    if lng == 'de':
+        stopwords_fn = 'data/stopword_list_de.txt'
+    else:
+        stopwords_fn = 'data/stopword_list.txt'
+    stop_words = np.array(open(stopwords_fn, 'r').read().split())
+    words = np.array(['word%d' % i for i in range(max(n_tokens // 20, 1))])
+    is_stopword = rng.random(n_tokens) < stopword_rate
+    strings = np.where(is_stopword,
+                       stop_words[(rng.zipf(1.3, n_tokens) - 1) % len(stop_words)],
+                       words[(rng.zipf(1.3, n_tokens) - 1) % len(words)])
+
+    origin_of_row = origin[token_of_row]
+    all_content = pd.DataFrame({'page_id': 1,
+                                'o_rev_id': rev_ids[origin_of_row],
+                                'token': strings[token_of_row],
+                                'token_id': token_of_row,
+                                'o_editor': rev_editor[origin_of_row],
+                                'in': ins,
+                                'out': outs,
+                                'article_title': 'Synthetic article'})
+
+    return all_content, revisions
+
+
+class SyntheticWikipediaDV:
+    """
+    Stands in for WikipediaDV where the pipeline only needs editor names, so the benchmarks do
+    not depend on the Wikipedia API.
+    """
+
+    def get_editors(self, editors):
+        return pd.DataFrame({'userid': list(editors),
+                             'name': [f'Editor {x}' if x != 0 else None for x in editors]})
@@ -9,12 +9,25 @@ from .api import API, DataView
 from .utils import chunks
 from itertools import chain
 from urllib.parse import quote_plus
+from concurrent.futures import ThreadPoolExecutor
 
 
 class WikipediaDV(DataView):
     """Summary
+
+    Attributes:
+        diff_cache (dict): revision diffs already downloaded, by (fromrev, torev)
     """
 
+    def __init__(self, api: API):
+        """Constructor of the WikipediaDV
+
+        Args:
+            api (API): the WikipediaAPI
+        """
+        super().__init__(api)
+        self.diff_cache = {}
+
     def get_page(self, page: Union[int, str]) -> pd.Series:
         """Get pageview counts for an page
 
@@ -124,9 +137,34 @@ class WikipediaDV(DataView):
     
     def get_talk_rev_diff(self, fromrev, torev) -> pd.Series:
 
-        res = self.api.get_talk_rev_diff(fromrev, torev) 
-        talk_diff = pd.Series(next(iter(res.values())))
+        key = (str(fromrev), str(torev))
+        if key not in self.diff_cache:
+            res = self.api.get_talk_rev_diff(fromrev, torev)
+            self.diff_cache[key] = next(iter(res.values()))
+        talk_diff = pd.Series(self.diff_cache[key])
         return talk_diff
+
+    def get_talk_rev_diffs(self, rev_pairs: list, max_workers: int = 8) -> dict:
+        """Get the diffs of several pairs of revisions, downloading the ones
+        that are not cached yet concurrently.
+
+        Args:
+            rev_pairs (list): (fromrev, torev) pairs
+            max_workers (int, optional): number of concurrent requests
+
+        Returns:
+            dict: diff (pd.Series) of each (fromrev, torev) pair
+        """
+        missing = list({(str(fromrev), str(torev)) for fromrev, torev in rev_pairs} - self.diff_cache.keys())
+
+        if len(missing) > 0:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                responses = executor.map(lambda pair: self.api.get_talk_rev_diff(*pair), missing)
+                for pair, res in zip(missing, responses):
+                    self.diff_cache[pair] = next(iter(res.values()))
+
+        return {(fromrev, torev): pd.Series(self.diff_cache[(str(fromrev), str(torev))])
+                for fromrev, torev in rev_pairs}
     
     def get_protection(self, page: str) -> pd.DataFrame:
         
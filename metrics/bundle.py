@@ -0,0 +1,316 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from metrics.conflict import ConflictManager
+
+
+class PageBundle:
+    """
+    A page analysis stored on disk so that it can be passed between the notebooks without
+    unpickling a whole ConflictManager. Each frame of the analysis is an uncompressed Arrow file
+    that is memory-mapped and converted only when it is first used, and a small manifest records
+    the page, the language and the last revision the analysis was calculated for, so a bundle of
+    an article that has been edited since is not reused. The conflicts and the elegible actions
+    are not stored twice: they are saved as boolean masks of the elegible frame. Core methods are
+    write() after ConflictManager.calculate(), find() to open the bundle of a page, get_manager()
+    and the source attribute, which replace the ConflictManager and its source dict, and
+    get_view() to read columns straight from the memory map.
+    ...
+    Attributes:
+    -----------
+    path (str): directory of the bundle.
+    manifest (dict): page_id, lng, rev_id, include_stopwords and the rows of each stored frame.
+    tables (dict): memory-mapped Arrow tables that have already been opened, by name.
+    rows (dict): row positions of the conflicts and the elegible actions in elegible.
+    frames (dict): frames and subsets that have already been converted to pandas, by name.
+    store (TokenStore): sources dict of the bundle, see the source attribute.
+    """
+
+    manifest_fn = 'manifest.json'
+    frame_names = ('all_content', 'revisions', 'elegible', 'all_actions')
+    masks = {'conflicts': '_ConflictManager__conflicts',
+             'elegible_actions': '_ConflictManager__elegible_actions'}
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, PageBundle.manifest_fn), 'r', encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        self.tables = {}
+        self.rows = {}
+        self.frames = {}
+        self.store = None
+
+    @staticmethod
+    def _check_arrow():
+        if pa is None:
+            raise ImportError("Page bundles need pyarrow, install it with 'pip install pyarrow'.")
+
+    @staticmethod
+    def get_path(directory, page_id, lng):
+        return os.path.join(directory, f"{lng}_{page_id}")
+
+    @staticmethod
+    def get_last_rev_id(revisions):
+        return int(revisions.sort_values('rev_time', kind='mergesort')['rev_id'].iloc[-1])
+
+    @classmethod
+    def write(cls, manager, directory, page_id):
+        """
+        Store a calculated ConflictManager.
+        ...
+        Parameters:
+        -----------
+        manager (ConflictManager): manager after calculate().
+        directory (str): directory holding the bundles, one subdirectory per page and language.
+        page_id (int): page the manager was calculated for.
+        ...
+        Returns:
+        --------
+        bundle (PageBundle): the written bundle.
+        """
+        cls._check_arrow()
+        path = cls.get_path(directory, page_id, manager.lng)
+        os.makedirs(path, exist_ok=True)
+
+        frames = {name: getattr(manager, name) for name in cls.frame_names if hasattr(manager, name)}
+        frames['masks'] = pd.DataFrame({name: getattr(manager, attr)
+                                        for name, attr in cls.masks.items()})
+        for name, df in frames.items():
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            with pa.OSFile(os.path.join(path, f"{name}.arrow"), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        # The manifest goes last, an interrupted write leaves no readable bundle.
+        manifest = {'page_id': int(page_id),
+                    'lng': manager.lng,
+                    'rev_id': cls.get_last_rev_id(manager.revisions),
+                    'include_stopwords': manager.include_stopwords,
+                    'frames': {name: len(df) for name, df in frames.items()}}
+        with open(os.path.join(path, cls.manifest_fn), 'w', encoding='utf-8') as file:
+            json.dump(manifest, file)
+
+        return cls(path)
+
+    @classmethod
+    def find(cls, directory, page_id, lng, rev_id=None):
+        """
+        Open the bundle of a page, or None if there is none. If rev_id (the last revision of the
+        page) is given, a bundle calculated for another revision is not returned either.
+        Without pyarrow the frames cannot be read, so there is no bundle either.
+        """
+        path = cls.get_path(directory, page_id, lng)
+        if pa is None or not os.path.exists(os.path.join(path, cls.manifest_fn)):
+            return None
+
+        bundle = cls(path)
+        if rev_id is not None and bundle.manifest['rev_id'] != int(rev_id):
+            return None
+
+        return bundle
+
+    def get_table(self, name):
+        """
+        Arrow table of a stored frame. The table is read from the memory map without copying;
+        its data is only paged in when it is converted.
+        """
+        if name not in self.tables:
+            if name not in self.manifest['frames']:
+                raise KeyError(name)
+            self._check_arrow()
+            source = pa.memory_map(os.path.join(self.path, f"{name}.arrow"), 'r')
+            self.tables[name] = pa.ipc.open_file(source).read_all()
+
+        return self.tables[name]
+
+    def get_rows(self, subset):
+        """Positions of the rows of a subset ('conflicts' or 'elegible_actions') in elegible."""
+        if subset not in self.rows:
+            self.rows[subset] = np.flatnonzero(self.get_table('masks').column(subset).to_numpy())
+
+        return self.rows[subset]
+
+    def get_view(self, name):
+        """
+        A stored frame, or a subset of elegible ('conflicts' or 'elegible_actions'), as an
+        ActionView of the memory-mapped table. Nothing is copied until a column is read.
+        """
+        if name in PageBundle.masks:
+            return ActionView(self.get_table('elegible'), self.get_rows(name))
+
+        return ActionView(self.get_table(name))
+
+    def __getitem__(self, name):
+        """
+        A stored frame, or a subset of elegible ('conflicts' or 'elegible_actions'), as pandas.
+        This is a copy out of the memory map (use get_view() to read columns without one); each
+        is converted once and the same frame is returned afterwards. A subset is taken from the
+        Arrow table by row positions, so only its rows are converted, not all of elegible.
+        """
+        if name not in self.frames:
+            if name in PageBundle.masks:
+                table = self.get_table('elegible').take(self.get_rows(name))
+            else:
+                table = self.get_table(name)
+            self.frames[name] = table.to_pandas()
+
+        return self.frames[name]
+
+    def __contains__(self, name):
+        return name in self.manifest['frames'] or (name in PageBundle.masks and 'masks' in self.manifest['frames'])
+
+    def __getstate__(self):
+        # Pickling (e.g. %store) keeps only the path, the frames are read again from the files.
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @property
+    def source(self):
+        if self.store is None:
+            self.store = TokenStore(self)
+
+        return self.store
+
+    def get_manager(self):
+        """
+        ConflictManager as it was after calculate(), without calculating it again. Its frames
+        are read from the bundle when they are first used.
+        """
+        return BundledConflictManager(self)
+
+
+class ActionView:
+    """
+    Rows of a memory-mapped Arrow table, either all of them or a selection by row positions (the
+    conflicts and the elegible actions are selections of elegible). Columns are read one at a
+    time: a column of the whole table that is numeric and has no missing values is a read-only
+    numpy view of the map, any other column is converted, and for a selection only its rows are
+    gathered.
+    ...
+    Attributes:
+    -----------
+    table (pa.Table): the base table.
+    rows (np.ndarray): positions of the rows in table, or None for all of them.
+    """
+
+    def __init__(self, table, rows=None):
+        self.table = table
+        self.rows = rows
+
+    def __len__(self):
+        return self.table.num_rows if self.rows is None else len(self.rows)
+
+    @property
+    def columns(self):
+        return [name for name in self.table.column_names if not name.startswith('__index_level_')]
+
+    def __getitem__(self, column):
+        """A column as a numpy array, see the class docstring for when it is a view."""
+        values = self.table.column(column)
+        if values.num_chunks == 1:
+            values = values.chunk(0)
+        if self.rows is None:
+            return values.to_numpy(zero_copy_only=False)
+
+        return values.take(pa.array(self.rows)).to_numpy(zero_copy_only=False)
+
+    def to_pandas(self):
+        """The rows as a pandas frame, a copy."""
+        table = self.table if self.rows is None else self.table.take(self.rows)
+
+        return table.to_pandas()
+
+
+class BundledConflictManager(ConflictManager):
+    """
+    A ConflictManager restored from a PageBundle. The attributes set by calculate() (the frames,
+    the conflict masks and, if stop words are included, the sources dict) are read from the
+    bundle the first time they are used, so methods that only need some frames only load those.
+    ...
+    Attributes:
+    -----------
+    bundle (PageBundle): bundle the frames are read from.
+    """
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.lng = bundle.manifest['lng']
+        self.include_stopwords = bundle.manifest['include_stopwords']
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet.
+        bundle = self.__dict__.get('bundle')
+        if bundle is None:
+            raise AttributeError(name)
+
+        if name in PageBundle.frame_names or name in PageBundle.masks:
+            if name not in bundle:
+                raise AttributeError(name)
+            value = bundle[name]
+        elif name in PageBundle.masks.values():
+            mask = next(key for key, attr in PageBundle.masks.items() if attr == name)
+            value = bundle['masks'][mask]
+        elif name == 'source' and self.include_stopwords:
+            value = bundle.source
+        else:
+            raise AttributeError(name)
+
+        setattr(self, name, value)
+        return value
+
+    def __getstate__(self):
+        # Pickling (e.g. %store) leaves out the frames, they are read again from the bundle.
+        loaded = set(PageBundle.frame_names) | set(PageBundle.masks) | set(PageBundle.masks.values())
+        return {name: value for name, value in self.__dict__.items() if name not in loaded}
+
+
+class TokenStore(dict):
+    """
+    The sources dict of a PageBundle ("tokens_all", "elegibles_all" and "conflicts_all"). The
+    listeners need pandas frames, so each source is converted on first access (see
+    PageBundle.__getitem__) and the same frame is then handed to every listener that gets the
+    dict; a source that is never used is never converted. Code that only reads some columns can
+    use PageBundle.get_view() instead. Other entries (e.g. "wiki_dv") can be set as in a plain
+    dict.
+    ...
+    Attributes:
+    -----------
+    bundle (PageBundle): bundle the sources are read from.
+    """
+
+    sources = {'tokens_all': 'all_actions',
+               'elegibles_all': 'elegible_actions',
+               'conflicts_all': 'conflicts'}
+
+    def __init__(self, bundle, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bundle = bundle
+
+    def __missing__(self, key):
+        if key not in TokenStore.sources:
+            raise KeyError(key)
+
+        self[key] = self.bundle[TokenStore.sources[key]]
+
+        return self[key]
+
+    def __contains__(self, key):
+        return key in TokenStore.sources or super().__contains__(key)
+
+    def copy(self):
+        return TokenStore(self.bundle, self)
+
+    def __reduce__(self):
+        # Pickling (e.g. %store) keeps the bundle and the other entries, not the sources.
+        others = {key: value for key, value in self.items() if key not in TokenStore.sources}
+        return TokenStore, (self.bundle, others)
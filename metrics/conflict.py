@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from metrics.profiler import StageProfiler
+
 
 class ConflictManager:
 
@@ -13,6 +15,7 @@ class ConflictManager:
             dataframe contains all the actions of those elegible tokens
         elegible_actions (pd.DataFrame): Only the actions that are elegible to have conflicts
         revisions (pd.DataFrame): Revisions as per received through the Wikiwho Actions API
+        profiler (StageProfiler): Time and memory of each stage of calculate(), see get_report()
     """
 
     def __init__(self, all_content, revisions,lng, include_stopwords=False):
@@ -21,37 +24,59 @@ class ConflictManager:
         self.include_stopwords = include_stopwords
         self.lng = lng
 
-    def calculate(self):
-
-        print('Preparing elegible token actions')
-        elegible = self.get_elegible()
-
-        print('Merge elegible actions and revisions')
-        elegible = self.merge_actions_and_revisions(
-            elegible, self.revisions)
-
-        print('Get the conflicts')
-        self.__conflicts = self.__get_conflicts(elegible)
+    def calculate(self, log_fn=None, verbose=True):
+        """ Runs all the stages. Each stage is measured (see StageProfiler); the measurements are
+        kept in profiler and, if log_fn (a JSON lines file) is given, appended to it. With
+        verbose=False the progress messages are not printed.
+        """
+        self.profiler = StageProfiler(log_fn, context={'lng': self.lng,
+                                                       'include_stopwords': self.include_stopwords,
+                                                       'content_rows': len(self.all_content)},
+                                      verbose=verbose)
+        span = self.profiler.span
+
+        with span('elegible', 'Preparing elegible token actions') as stage:
+            elegible = self.get_elegible()
+            stage['rows'] = len(elegible)
+
+        with span('merge', 'Merge elegible actions and revisions') as stage:
+            elegible = self.merge_actions_and_revisions(
+                elegible, self.revisions)
+            stage['rows'] = len(elegible)
+
+        with span('conflicts', 'Get the conflicts') as stage:
+            self.__conflicts = self.__get_conflicts(elegible)
+            stage['rows'] = int(self.__conflicts.sum())
         
-        print('Calculate time differences of undos')
-        elegible = self.__calculate_time_diffs(elegible)
+        with span('time_diffs', 'Calculate time differences of undos') as stage:
+            elegible = self.__calculate_time_diffs(elegible)
+            stage['rows'] = len(elegible)
+
+        with span('elegible_actions', 'Get elegible_actions') as stage:
+            self.__elegible_actions = self.__get_elegible_actions(elegible)
+            stage['rows'] = int(self.__elegible_actions.sum())
 
-        print('Get elegible_actions')
-        self.__elegible_actions = self.__get_elegible_actions(elegible)
+        with span('scoring', 'Calculate the token conflict') as stage:
+            self.elegible = self.calculate_token_conflict_score(
+                elegible, self.__conflicts)
 
-        print('Calculate the token conflict')
-        self.elegible = self.calculate_token_conflict_score(
-            elegible, self.__conflicts)
+            self.conflicts = self.elegible[self.__conflicts]
+            self.elegible_actions = self.elegible[self.__elegible_actions]
+            stage['rows'] = len(self.conflicts)
 
-        self.conflicts = self.elegible[self.__conflicts]
-        self.elegible_actions = self.elegible[self.__elegible_actions]
-        self.all_actions = self.__get_all_actions()
+        with span('all_actions') as stage:
+            self.all_actions = self.__get_all_actions()
+            stage['rows'] = len(self.all_actions)
         
         if self.include_stopwords:
             self.get_source_dict()
 
         return self.elegible
 
+    def get_report(self):
+        """ Time, memory and rows of each stage of the last calculate() """
+        return self.profiler.get_report()
+
     def get_conflicting_actions(self, editor):
         return self.elegible[self.__conflicts.shift(-1) & (
             self.elegible.shift(-1)['editor'] == editor)]
@@ -261,4 +286,4 @@ class ConflictManager:
         return joined.sort_values('conflict_score', ascending=False)
 
     def get_source_dict(self):
-        self.source = {"tokens_all": self.all_actions, "elegibles_all": self.elegible_actions, "conflicts_all": self.conflicts}
\ No newline at end of file
+        self.source = {"tokens_all": self.all_actions, "elegibles_all": self.elegible_actions, "conflicts_all": self.conflicts}
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+
+class OwnershipManager:
+    """
+    A class to follow the ownership of tokens over time. A token is owned by its original editor
+    (o_editor) while it is present in the article, i.e. while its last action is not an 'out'.
+    Instead of filtering all the actions again for every date, the actions are swept once in time
+    order: each action is turned into a change of the number of present tokens (+1 if it brings
+    the token back, -1 if it removes it, 0 otherwise), so the number of owned tokens at any date is
+    a cumulative sum that is looked up with a binary search. Core methods are get_owned() for a
+    single editor and get_owned_history() for all editors at once.
+    ...
+    Attributes:
+    -----------
+    actions (pd.DataFrame): actions sorted by rev_time (timezone naive) with the columns token_id,
+                rev_time, o_editor and change.
+    times (np.ndarray): rev_time of the sorted actions (datetime64[ns]).
+    total (np.ndarray): number of present tokens after each of the sorted actions.
+    """
+
+    def __init__(self, all_actions):
+        actions = all_actions[['token_id', 'rev_time', 'action', 'o_editor']].copy()
+        actions['rev_time'] = pd.to_datetime(actions['rev_time'])
+        if actions['rev_time'].dt.tz is not None:
+            actions['rev_time'] = actions['rev_time'].dt.tz_localize(None)
+
+        # Actions whose revision could not be matched have no time, they never count.
+        actions = actions[actions['rev_time'].notnull()]
+
+        # State of each token after each action, compared to its state after the previous action.
+        actions = actions.sort_values(['token_id', 'rev_time'], kind='mergesort')
+        present = (actions['action'] != 'out').values.astype(np.int64)
+        previous = np.concatenate([[0], present[:-1]])
+        previous[(actions['token_id'] != actions['token_id'].shift(1)).values] = 0
+        actions['change'] = present - previous
+
+        # Sweep the changes in time order.
+        self.actions = actions.sort_values('rev_time', kind='mergesort').reset_index(drop=True)
+        self.times = self.actions['rev_time'].values
+        self.total = np.cumsum(self.actions['change'].values)
+
+    def _lookup(self, cumulative, dates):
+        """
+        Value of a cumulative array right after the last action that happened at or before
+        each of the dates (0 if no action happened yet).
+        """
+        idx = np.searchsorted(self.times, np.asarray(dates, dtype='datetime64[ns]'), side='right') - 1
+        return np.where(idx >= 0, cumulative[np.maximum(idx, 0)], 0)
+
+    def get_owned(self, editor, dates):
+        """
+        Number of tokens owned by an editor and number of tokens present in the article.
+        ...
+        Parameters:
+        -----------
+        editor (str): editor id, compared with the o_editor column.
+        dates (array-like): dates (timezone naive) at which the counts are taken; actions
+                happening exactly at a date are included.
+        ...
+        Returns:
+        --------
+        owned (np.ndarray): tokens of the editor present at each date.
+        total (np.ndarray): all tokens present at each date.
+        """
+        is_editor = (self.actions['o_editor'] == editor).values
+        owned = np.cumsum(self.actions['change'].values * is_editor)
+
+        return self._lookup(owned, dates), self._lookup(self.total, dates)
+
+    def get_owned_history(self, dates, owners=None):
+        """
+        Number of tokens owned by every editor at each date, computed in one pass over the
+        actions. Only the (date, owner) pairs whose count changes are aggregated; the counts are
+        then repeated until the next change, and pairs with no owned tokens are never stored.
+        ...
+        Parameters:
+        -----------
+        dates (array-like): dates (timezone naive) at which the counts are taken; actions
+                happening exactly at a date are included.
+        owners (Union[dict, pd.Series], optional): maps o_editor to the label the tokens are
+                counted by (e.g. the editor name). Tokens whose o_editor is not mapped are not
+                counted. By default the o_editor itself is used.
+        ...
+        Returns:
+        --------
+        history (pd.DataFrame): |rev_time|owner|owned|, one row per date and owner with at least
+                one owned token, sorted by rev_time.
+        """
+        dates = np.sort(np.asarray(dates, dtype='datetime64[ns]'))
+        if owners is None:
+            labels = self.actions['o_editor']
+        else:
+            labels = self.actions['o_editor'].map(owners)
+
+        # Each action changes the counts from the first date that is not before it.
+        changes = pd.DataFrame({'date': np.searchsorted(dates, self.times, side='left'),
+                                'owner': labels.values,
+                                'change': self.actions['change'].values})
+        changes = changes[(changes['date'] < len(dates)) & changes['owner'].notnull() & (changes['change'] != 0)]
+
+        # Sparse changes per (owner, date) and the owned count right after each of them.
+        points = changes.groupby(['owner', 'date'])['change'].sum().reset_index()
+        points['owned'] = points.groupby('owner')['change'].cumsum()
+
+        # A count holds until the next change of the same owner, or until the last date.
+        next_date = points['date'].shift(-1).fillna(len(dates)).astype(int).values
+        next_date[(points['owner'] != points['owner'].shift(-1)).values] = len(dates)
+        points['run'] = next_date - points['date'].values
+        points = points[points['owned'] != 0]
+
+        # Expand the runs.
+        run = points['run'].values
+        starts = np.repeat(points['date'].values, run)
+        offsets = np.arange(run.sum()) - np.repeat(np.cumsum(run) - run, run)
+        history = pd.DataFrame({'rev_time': dates[starts + offsets],
+                                'owner': np.repeat(points['owner'].values, run),
+                                'owned': np.repeat(points['owned'].values, run)})
+
+        return history.sort_values('rev_time', kind='mergesort').reset_index(drop=True)
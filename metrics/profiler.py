@@ -0,0 +1,108 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the memory of the stages is then not recorded.
+    resource = None
+
+
+class StageProfiler:
+    """
+    A class to measure the stages of a calculation. Each stage runs inside span(), which records
+    its wall time, CPU time, the growth of the peak memory of the process and the rows it
+    produced, and, when tracemalloc is tracing, the peak memory the stage allocated; the spans are collected in a report and, if a log file is given, appended to it as
+    JSON lines so the runs of different articles can be compared. Core methods are span() and
+    get_report().
+    ...
+    Attributes:
+    -----------
+    log_fn (str): JSON lines file the spans are appended to, or None.
+    context (dict): fields added to every logged span (e.g. the language).
+    verbose (bool): print the message of each stage when it starts.
+    spans (list): one dict per finished stage, in order; a stage that raised is marked failed.
+    traced_peak (int): highest memory traced by tracemalloc during the spans, in bytes. Each span
+            resets the peak of tracemalloc, so whoever traces the whole calculation reads it here.
+    """
+
+    def __init__(self, log_fn=None, context=None, verbose=True):
+        self.log_fn = log_fn
+        self.context = context if context is not None else {}
+        self.verbose = verbose
+        self.spans = []
+        self.traced_peak = 0
+
+    @staticmethod
+    def get_peak_rss():
+        """Peak resident memory of the process in MB, or None if it cannot be read."""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Linux reports kilobytes, macOS bytes.
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+    def is_tracing(self):
+        # tracemalloc.reset_peak() needs Python 3.9.
+        return tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak')
+
+    @contextmanager
+    def span(self, stage, message=None):
+        """
+        Measure the block as a stage. The yielded dict is the record of the stage, the block
+        sets its 'rows' (rows of the frame the stage produced).
+        ...
+        Parameters:
+        -----------
+        stage (str): name of the stage.
+        message (str, optional): progress message printed when the stage starts.
+        """
+        if self.verbose and message is not None:
+            print(message)
+
+        record = {'stage': stage, 'rows': None, 'failed': False}
+        peak = self.get_peak_rss()
+        tracing = self.is_tracing()
+        if tracing:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            self.traced_peak = max(self.traced_peak, traced_peak)
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            # A stage that raised is still closed and recorded, up to where it failed.
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            # The peak only grows: the delta is how much the stage raised it, not what it allocated.
+            record['peak_rss_delta_mb'] = None if peak is None else self.get_peak_rss() - peak
+            # What the stage allocated above the memory already in use when it started.
+            record['peak_traced_mb'] = None
+            if tracing:
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                self.traced_peak = max(self.traced_peak, traced_peak)
+                record['peak_traced_mb'] = (traced_peak - traced) / 2**20
+            self.spans.append(record)
+
+            if self.log_fn is not None:
+                with open(self.log_fn, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps({**self.context, **record}) + '\n')
+
+    def get_report(self):
+        """
+        Returns:
+        --------
+        report (pd.DataFrame): |stage|rows|wall_s|cpu_s|peak_rss_delta_mb|peak_traced_mb|failed|,
+                one row per stage.
+        """
+        return pd.DataFrame(self.spans, columns=['stage', 'rows', 'wall_s', 'cpu_s', 'peak_rss_delta_mb',
+                                                 'peak_traced_mb', 'failed'])
@@ -33,7 +33,7 @@ class TokensManager:
                       Relationships of three columns:
                       (sample["bool_adds"] + sample["bool_dels"] + sample["bool_reins"]).unique() = array([1])
         """
-        sample = self.all_actions.copy().reset_index(drop=True)
+        sample = self.all_actions.reset_index(drop=True)
 
         # Get differences of columns 'token_id' and 'rev_time'
         diff_actions = sample[['token_id', 'rev_time']] - sample.shift(1)[['token_id', 'rev_time']]
@@ -94,9 +94,8 @@ class TokensManager:
         -----------
         action (pd.DataFrame): dataframe of a particular action, for example, all "add" actions.
         """
-        action = df_with_bools.copy()
+        action = df_with_bools[df_with_bools[bool_col] == 1].reset_index(drop=True)
         action['survive'] = action[bool_col] * action['bool_survive']
-        action = action[action[bool_col] == 1].reset_index(drop=True)
         action = action.drop(['tokenid_diff', 'time_diff','bool_adds', 'bool_dels', 'bool_reins', 'bool_survive'], axis=1)
         action.set_index('rev_id', inplace=True)
     
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip('plotly')
+pytest.importorskip('qgrid')
+
+from visualization.templates_listener import TemplateListener
+
+
+@pytest.fixture
+def listener():
+    listener = TemplateListener.__new__(TemplateListener)
+    listener.tl = ['featured', 'good', 'pov']
+    return listener
+
+
+def test_template_capturer_after_extra_brace(listener):
+    assert listener._template_capturer('x{{{featured article}}') == {'featured'}
+
+
+def test_template_capturer_in_diff_lines(listener):
+    html = ('<td class="diff-addedline"><div>{{<ins class="diffchange diffchange-inline">pov</ins>'
+            '<td class="diff-deletedline"><div>{{good article}}')
+    assert listener._template_capturer(html) == {'pov', 'good'}
+
+
+def test_template_capturer_ignores_other_text(listener):
+    assert listener._template_capturer('{{featured list}} featured article}}') == set()
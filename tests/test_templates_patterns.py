@@ -0,0 +1,23 @@
+from visualization.templates_patterns import PROTECT_PAIRS_PATTERN, PROTECT_TRAILING_PATTERN, TEMPLATE_DIFF_PATTERN
+
+
+def get_rests(html):
+    return [match.group(5) for match in TEMPLATE_DIFF_PATTERN.finditer(html)]
+
+
+def test_template_after_extra_brace():
+    # Both '{{' of '{{{' are tried, the second one is followed by the template name.
+    assert get_rests('x{{{featured article}}') == ['', 'featured article}}']
+
+
+def test_template_in_diff_line():
+    html = '<td class="diff-addedline"><div>{{<ins class="diffchange diffchange-inline">pov</ins>'
+    # The first match starts at the diff line, a second one at the '{{' itself.
+    match = TEMPLATE_DIFF_PATTERN.search(html)
+    assert match.groups() == ('<td class="diff-addedline"><div>', 'added', 'ins', 'pov', '')
+
+
+def test_protect_entries():
+    assert PROTECT_PAIRS_PATTERN.findall('[edit=autoconfirmed] (indefinite)[move=sysop] (indefinite)') == [
+        ('edit=autoconfirmed', 'indefinite'), ('move=sysop', 'indefinite')]
+    assert PROTECT_TRAILING_PATTERN.search('Vandalism [edit=sysop:move=sysop]').group(1) == 'edit=sysop:move=sysop'
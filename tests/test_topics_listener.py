@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('plotly')
+
+from visualization.topics_listener import TopicsListener
+
+
+class TalkDiffs:
+
+    def get_talk_rev_diffs(self, rev_pairs):
+        return {(fromrev, torev): {'fromrevid': fromrev, 'torevid': torev, '*': f'==Topic {torev}=='}
+                for fromrev, torev in rev_pairs}
+
+
+def test_extract_topics_with_repeated_index():
+    # Talk content appended batch by batch, from the newest revision to the oldest.
+    batches = [pd.DataFrame({'revid': [6, 5, 4], 'comment': ['', '/* Old */ reply', '']}),
+               pd.DataFrame({'revid': [3, 2, 1], 'comment': ['', '/* Old */ new section', '']})]
+    talk_content = pd.concat(batches)
+    talk_content['user'] = 'Editor'
+    talk_content['year_month'] = pd.Timestamp('2020-01-01')
+
+    topic_df = TopicsListener(talk_content).extract_topics(TalkDiffs()).reset_index()
+
+    # The oldest revision has no previous one to take the diff from.
+    assert dict(zip(topic_df['revid'], topic_df['topics'])) == {
+        6: 'Topic 6', 5: ' Old ', 4: 'Topic 4', 3: 'Topic 3', 2: ' Old '}
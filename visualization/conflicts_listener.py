@@ -12,7 +12,6 @@ from metrics.token import TokensManager
 from .editors_listener import remove_stopwords
 
 import calendar
-from datetime import date, timedelta
 
 
 class ConflictsListener():
@@ -201,35 +200,44 @@ class ConflictsActionListener():
             print(url)
         
     def add_columns(self, df):
+        df = df.reset_index(drop=True).rename(columns={"editor":'editor_id'})
+        df['editor_id'] = df['editor_id'].astype(str)
         #time_diff_secs
         df['time_diff_secs'] = df['time_diff'].dt.total_seconds()
-        #editor names
-        df = df.rename(columns={"editor":'editor_id'})
-        self.sources['Editors']['editor_id'] = self.sources['Editors']['editor_id'].astype(str)
-        df['editor_id'] = df['editor_id'].astype(str)
-        conflicts_merged = self.sources['Editors'][['editor_id', 'name']].merge(df, on='editor_id', how='outer')
-        df = conflicts_merged[conflicts_merged['token'].notnull()].copy()
         
         #filling values for original insertions
-        original = pd.merge(df[df['rev_id'] == -1], self.sources['Revisions'][['rev_time', 'rev_id']],how='left', left_on='o_rev_id', right_on='rev_id')
-        df.loc[df['rev_id'] == -1, 'rev_time'] = original['rev_time_y'].tolist()
-        df.loc[df['rev_id'] == -1, 'editor_id'] = df.loc[df['rev_id'] == -1, 'o_editor']
-        df.loc[df['rev_id'] == -1, 'time_diff'] = 0
-        df.loc[df['rev_id'] == -1, 'time_diff_secs'] = 0
-        df.loc[(df['action'] == 'in') & (df['rev_id'] == -1), 'rev_id'] = df.loc[(df['action'] == 'in') & (df['rev_id'] == -1), 'o_rev_id']
-        df = df.loc[df['rev_id'] != -1]
-        
-        #order and count columns
-        #self.conflicts.reset_index(inplace=True)
-        counts = df[['token_id', 'token']].groupby(['token_id']).count()
+        original = df['rev_id'] == -1
+        if original.any():
+            rev_times = self.sources['Revisions'].drop_duplicates('rev_id').set_index('rev_id')['rev_time']
+            df.loc[original, 'rev_time'] = df.loc[original, 'o_rev_id'].map(rev_times)
+            df.loc[original, 'editor_id'] = df.loc[original, 'o_editor'].astype(str)
+            df.loc[original, 'time_diff'] = 0
+            df.loc[original, 'time_diff_secs'] = 0
+            df.loc[original & (df['action'] == 'in'), 'rev_id'] = df.loc[original & (df['action'] == 'in'), 'o_rev_id']
+            df = df.loc[df['rev_id'] != -1].reset_index(drop=True)
+        
+        #editor names
+        editors = self.sources['Editors'].drop_duplicates('editor_id')
+        names = pd.Series(editors['name'].values, index=editors['editor_id'].astype(str))
+        df['name'] = df['editor_id'].map(names)
+        
         #count column
-        df = counts.merge(df, left_index=True, right_on='token_id', how='outer').rename(columns = {'token_x':'count','token_y':'token'}).reset_index()
+        df['count'] = df.groupby('token_id')['token'].transform('count')
         #order column
-        g = df.sort_values(['time_diff_secs']).groupby('token_id', as_index=False)
-        df['order'] = g.cumcount()
-        df['order'] = df['order'].apply(lambda x: x + 1)
+        df['order'] = df.sort_values('time_diff_secs', kind='mergesort').groupby('token_id').cumcount() + 1
         
         return df
+    
+    def get_conflicts(self, stopwords):
+        # Both stopword variants are built once and kept, the date range is applied afterwards.
+        if self.conflicts_dict[stopwords] is None:
+            if stopwords == 'Not included':
+                conflicts = remove_stopwords(self.sources["tokens_source"]["conflicts_all"], self.lng)
+            else:
+                conflicts = self.sources["tokens_source"]["conflicts_all"]
+            self.conflicts_dict[stopwords] = self.add_columns(conflicts)
+            
+        return self.conflicts_dict[stopwords]
 
 #         for token_id in self.conflicts['token_id'].unique():
 #             token_df = self.conflicts.loc[self.conflicts['token_id'] == token_id].sort_values(by='time_diff_secs').copy()
@@ -251,27 +259,7 @@ class ConflictsActionListener():
         return conflicts_for_grid.loc[conflicts_for_grid['string']!='<!--']
         
     def listen_to_interact(self, _range1, _range2, stopwords):
-        if stopwords == 'Not included':
-            if self.conflicts_dict["Not included"] is None:
-                conflicts_not_included = remove_stopwords(self.sources["tokens_source"]["conflicts_all"],self.lng).reset_index(drop=True)
-                self.conflicts_dict["Not included"] = self.add_columns(conflicts_not_included)
-                self.conflicts_dict["Not included"] = self.get_displayed_df(_range1, _range2, self.conflicts_dict["Not included"])
-                conflicts = self.conflicts_dict["Not included"]
-            else:
-                conflicts = self.conflicts_dict["Not included"]
-                
-        else:
-            if self.conflicts_dict["Included"] is None:
-                link_df = self.sources["tokens_source"]["conflicts_all"]
-                self.conflicts_dict["Included"] = link_df
-                del link_df
-                conflicts_included = self.add_columns(self.conflicts_dict["Included"])
-                self.conflicts_dict["Included"] = self.add_columns(conflicts_included)
-                self.conflicts_dict["Not Included"] = self.get_displayed_df(_range1, _range2, self.conflicts_dict["Included"])
-                conflicts = self.conflicts_dict["Included"]
-            else:
-                conflicts = self.conflicts_dict["Included"]
-            
+        conflicts = self.get_displayed_df(_range1, _range2, self.get_conflicts(stopwords))
         
         if len(conflicts) > 0:
             self.qgrid_token_obj = qgrid.show_grid(conflicts,grid_options={'forceFitColumns':False})
@@ -285,27 +273,7 @@ class ConflictsActionListener():
             display(HTML(f'<a href="{get_previous_notebook()}" target="_blank">Go back to the previous workbook</a>'))
             
     def listen(self, _range1, _range2, stopwords):
-        if stopwords == 'Not included':
-            if self.conflicts_dict["Not included"] is None:
-                conflicts_not_included = remove_stopwords(self.sources["tokens_source"]["conflicts_all"],self.lng).reset_index(drop=True)
-                self.conflicts_dict["Not included"] = self.add_columns(conflicts_not_included)
-                self.conflicts_dict["Not included"] = self.get_displayed_df(_range1, _range2, self.conflicts_dict["Not included"])
-                conflicts = self.conflicts_dict["Not included"]
-            else:
-                conflicts = self.conflicts_dict["Not included"]
-                
-        else:
-            if self.conflicts_dict["Included"] is None:
-                link_df = self.sources["tokens_source"]["conflicts_all"]
-                self.conflicts_dict["Included"] = link_df
-                del link_df
-                conflicts_included = self.add_columns(self.conflicts_dict["Included"])
-                self.conflicts_dict["Included"] = self.add_columns(conflicts_included)
-                self.conflicts_dict["Not Included"] = self.get_displayed_df(_range1, _range2, self.conflicts_dict["Included"])
-                conflicts = self.conflicts_dict["Included"]
-            else:
-                conflicts = self.conflicts_dict["Included"]
-            
+        conflicts = self.get_displayed_df(_range1, _range2, self.get_conflicts(stopwords))
         
         if len(conflicts) > 0:
             qgrid_token_obj = qgrid.show_grid(conflicts,grid_options={'forceFitColumns':False})
@@ -324,39 +292,43 @@ class ConflictsEditorListener():
         self.token_conflict = self.sources["conflict_manager"].conflicts
         self.token_elegible = self.sources["conflict_manager"].elegible_actions
         self.editor_names = editor_names
+        self.token_summary = None
+        self.token_store = None
+        self.editor_month = None
         
         self.qg_obj = None
         self.out = Output()
         
     
-    def __change_date(self, old_date):
-        new_date = pd.Timestamp(old_date.year, old_date.month, old_date.day)
+    def __change_date(self, old_dates):
+        new_dates = pd.to_datetime(old_dates)
+        if new_dates.dt.tz is not None:
+            new_dates = new_dates.dt.tz_localize(None)
     
-        return new_date
+        return new_dates.dt.floor("D")
     
     
     def get_editor_month(self):
-        elegible_no_init = self.token_elegible.copy()
-        all_actions = self.token_source.copy()
+        # The table only depends on the sources, compute it once.
+        if self.editor_month is not None:
+            return self.editor_month
+        
+        elegible_no_init = self.token_elegible[["rev_time", "editor", "conflict", "action"]].copy()
         
-        elegible_no_init["rev_time"] = elegible_no_init["rev_time"].apply(lambda x: self.__change_date(x))
-        elegible_no_init['time_diff_secs'] = elegible_no_init['time_diff'].dt.total_seconds()
+        elegible_no_init["rev_time"] = self.__change_date(elegible_no_init["rev_time"])
+        elegible_no_init['time_diff_secs'] = self.token_elegible['time_diff'].dt.total_seconds()
         
         # Classify conflicts
         conflict_agg = elegible_no_init.groupby(["rev_time", "editor"]).agg({'conflict': 'sum', "action":"count", "time_diff_secs": "mean"}).reset_index().rename({"editor": "editor_id", "time_diff_secs":"reaction_time"}, axis=1)
         
         #retrieve adds, dels and reins (as well as their survival rate)
         #tokensmanager = TokensManager(all_actions)
-        adds_actions = self.sources["actions"]["adds"].copy()
-        dels_actions = self.sources["actions"]["dels"].copy()
-        reins_actions = self.sources["actions"]["reins"].copy()
-        
         #adds_actions, dels_actions, reins_actions = tokensmanager.token_survive()
-        adds_actions.rename(columns = {"action": "additions", "survive": "adds_survive"}, inplace = True)
-        dels_actions.rename(columns = {"action": "deletions", "survive": "dels_survive"}, inplace = True)
-        reins_actions.rename(columns = {"action": "reinsertions", "survive": "reins_survive"}, inplace = True)
+        adds_actions = self.sources["actions"]["adds"].rename(columns = {"action": "additions", "survive": "adds_survive"})
+        dels_actions = self.sources["actions"]["dels"].rename(columns = {"action": "deletions", "survive": "dels_survive"})
+        reins_actions = self.sources["actions"]["reins"].rename(columns = {"action": "reinsertions", "survive": "reins_survive"})
         agg_actions = pd.concat([adds_actions, dels_actions, reins_actions], sort=False)
-        agg_actions["rev_time"] = agg_actions["rev_time"].apply(lambda x: self.__change_date(x))
+        agg_actions["rev_time"] = self.__change_date(agg_actions["rev_time"])
         
         #count aggregated number per user per month
         all_actions_agg = agg_actions.groupby(["rev_time", "editor"]).agg({"additions":"count", 'adds_survive': 'sum', 
@@ -365,70 +337,113 @@ class ConflictsEditorListener():
         #merge conflict score and aggregated actions
         editor_group = pd.merge(conflict_agg, all_actions_agg,  how='left', left_on=['rev_time', 'editor_id'], right_on = ['rev_time', 'editor'])
         #adding productivity (number of actions survived 48h divided by all actions)
-        editor_group['productivity'] = editor_group.apply(lambda x:(x['adds_survive']+x['dels_survive']+x['reins_survive']) / (x['additions']+x['deletions']+x['reinsertions']),axis=1)
+        editor_group['productivity'] = ((editor_group['adds_survive'] + editor_group['dels_survive'] + editor_group['reins_survive']) /
+                                        (editor_group['additions'] + editor_group['deletions'] + editor_group['reinsertions']))
 
     
         # Merge to new table
         editor_names = self.editor_names.copy()
         editor_names["editor_id"] = editor_names["editor_id"].astype(str)
         editor_group["reaction_time"] = editor_group["reaction_time"].astype(int)
-        editor_month_conf = editor_names[['editor_id', 'name']].merge(editor_group, right_index=True,how="right", 
+        editor_month_conf = editor_names[['editor_id', 'name']].merge(editor_group, how="right", 
                                                            on='editor_id').sort_values("rev_time").set_index("rev_time")
         editor_month_conf["conflict"] = editor_month_conf["conflict"] / editor_month_conf["action"]
         editor_month_conf = editor_month_conf[editor_month_conf["conflict"] != 0]
         editor_month_conf.drop(["action", "adds_survive", "dels_survive", "reins_survive"], axis=1, inplace=True)
+        self.editor_month = editor_month_conf
         
         return editor_month_conf
     
     
-    def __count_in_out(self, df):
-        mask_out = (df["action"] == "out").astype(int)
-        mask_in = (df["action"] == "in").astype(int)
-        df["in_action"] = mask_in
-        df["out_action"] = mask_out
-
-        count_list = []
-        for tokenid in df["token_id"].unique():
-            df_token = df[df["token_id"] == tokenid]
-            df_count = pd.DataFrame(data={"token_id": tokenid,
-                                    "in_actions": df_token["in_action"].sum(),
-                                    "out_actions": df_token["out_action"].sum()}, index=[0]).set_index("token_id")
-            count_list.append(df_count)
-        
-        return pd.concat(count_list)
+    def __count_in_out(self, df, keys):
+        in_actions = (df["action"] == "in").astype(int).groupby(keys).sum().rename("in_actions")
+        out_actions = (df["action"] == "out").astype(int).groupby(keys).sum().rename("out_actions")
+        
+        return pd.concat([in_actions, out_actions], axis=1)
     
     
-    def __date_editor_filter(self, df, year_month, editor_id=None):
-        year, month, day = year_month
-        selected_time_start = date(year, month, day)
-        selected_time_end = selected_time_start + timedelta(days=1)
-        #selected_time_end = date(year, month, calendar.monthrange(year,month)[1])
-
-        mask_date = (selected_time_start <= df["rev_time"].dt.date) & (selected_time_end > df["rev_time"].dt.date)
-        if editor_id != None:
-            mask_editor = df["editor"] == editor_id
-        else:
-            mask_editor = mask_date
-
-        return mask_date & mask_editor
+    def __day_editor_token(self, df):
+        "Keys to group actions by day, editor and token."
+        rev_time = df["rev_time"]
+        if rev_time.dt.tz is not None:
+            rev_time = rev_time.dt.tz_localize(None)
+            
+        return [rev_time.dt.floor("D").rename("rev_time"), df["editor"], df["token_id"]]
+    
+    
+    def __get_token_summary(self):
+        """
+        Summary of the conflicting tokens of every editor in every day, indexed by 
+        (rev_time, editor, token_id), so the tokens of a selected row are an index lookup.
+        """
+        source_keys = self.__day_editor_token(self.token_source)
+        conflict_keys = self.__day_editor_token(self.token_conflict)
+        elegible_keys = self.__day_editor_token(self.token_elegible)
+        
+        # Classification and merge.
+        selected_source = self.token_source["rev_id"].groupby(source_keys).count().rename("revisions")
+        selected_conflicts = pd.concat([self.token_conflict["action"].groupby(conflict_keys).count().rename("conflicts"),
+                                self.token_conflict["conflict"].groupby(conflict_keys).sum()], axis=1)
+        selected_elegibles = self.token_elegible["action"].groupby(elegible_keys).count().rename("elegibles").to_frame()
+        
+        selected_elegibles = selected_elegibles.join(selected_source, how="inner")
+        
+        in_out = self.__count_in_out(self.token_source, source_keys)
+        selected_elegibles = selected_elegibles.join(in_out, how="inner")
+        
+        token_summary = selected_elegibles.join(selected_conflicts, how="left")
+        token_summary["conflict"] = token_summary["conflict"] / token_summary["elegibles"]
+        token_summary = token_summary.fillna(0)
+        
+        strings = self.token_elegible[["token_id", "token"]].drop_duplicates("token_id").set_index("token_id")["token"]
+        token_summary["token"] = token_summary.index.get_level_values("token_id").map(strings)
+        token_summary = token_summary[token_summary["conflict"] != 0]
+        
+        return token_summary[["token", "elegibles", "conflicts", "conflict",
+                        "revisions", "in_actions", "out_actions"]].sort_index()
+    
+    
+    def __get_token_store(self):
+        """
+        Actions sorted by token (keeping their order within each token) with the conflict score
+        of the elegible ones, stored as arrays with the offset where each token starts.
+        """
+        store = self.token_source[["token_id", "rev_id", "editor"]].merge(
+                        self.token_elegible[["token_id", "rev_id", "conflict"]], on=["token_id", "rev_id"], how="left")
+        order = np.argsort(store["token_id"].values, kind="mergesort")
+        
+        token_store = {"token_id": store["token_id"].values[order],
+                       "editor": store["editor"].values[order],
+                       "conflict": store["conflict"].values[order]}
+        token_store["tokens"], token_store["starts"] = np.unique(token_store["token_id"], return_index=True)
+        token_store["ends"] = np.append(token_store["starts"][1:], len(order))
+        
+        return token_store
     
     
     def __get_main_opponent(self, editor_id, token_indices, editor_dict):
-        elegible_actions = self.token_elegible.copy()
-        all_actions = self.token_source.copy()
-        
-        main_opponents = []
-        for token_id in token_indices:
-            elegible_token = elegible_actions[elegible_actions["token_id"] == token_id].set_index("rev_id")
-            all_token = all_actions[all_actions["token_id"] == token_id].set_index("rev_id")
-            merged_token = all_token.merge(elegible_token, how="left")
-            
-            sort_token = merged_token[merged_token["editor"] == editor_id].sort_values("conflict", ascending=False)
-            opponent_idx = sort_token.iloc[[0]].index - 1
-            opponent_df = merged_token.loc[opponent_idx]
-            main_opponents.append(opponent_df[["token_id", "editor"]].set_index("token_id"))
-
-        main_opponents = pd.concat(main_opponents)
+        """
+        The main opponent of an editor in a token is the editor of the action preceding the
+        editor's action with the highest conflict score on that token.
+        """
+        if self.token_store is None:
+            self.token_store = self.__get_token_store()
+        store = self.token_store
+        
+        # Rows of all the selected tokens.
+        token_pos = np.searchsorted(store["tokens"], token_indices)
+        starts, ends = store["starts"][token_pos], store["ends"][token_pos]
+        lengths = ends - starts
+        rows = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        
+        # Highest scored action of the editor in each token.
+        editor_rows = pd.DataFrame({"row": rows, "token_id": store["token_id"][rows],
+                                    "conflict": store["conflict"][rows]})[store["editor"][rows] == editor_id]
+        top_rows = editor_rows.sort_values("conflict", ascending=False, kind="mergesort").drop_duplicates("token_id")
+        
+        main_opponents = pd.DataFrame({"token_id": top_rows["token_id"].values,
+                                       "editor": store["editor"][top_rows["row"].values - 1]}).set_index("token_id")
+        main_opponents = main_opponents.reindex(token_indices).dropna()
         main_opponents.replace((editor_dict), inplace=True)
 
         return main_opponents
@@ -441,38 +456,15 @@ class ConflictsEditorListener():
             year_and_month = (df_selected.index[0].year, df_selected.index[0].month, df_selected.index[0].day)
             display(md(f"In **{year_and_month[2]}.{year_and_month[1]}.{year_and_month[0]}** you have selected the editor **{df_selected['name'].values[0]}**"))
 
-            # All actions.
-            selected_source_tokens = self.token_source.loc[self.__date_editor_filter(self.token_source, 
-                                                             year_and_month, editor_id)].reset_index(drop=True)
-
-            # Conflicts.
-            selected_conflict_tokens = self.token_conflict.loc[self.__date_editor_filter(self.token_conflict, 
-                                                            year_and_month, editor_id)].reset_index(drop=True)
-
-            # Elegibles.
-            selected_elegible_tokens = self.token_elegible.loc[self.__date_editor_filter(self.token_elegible, 
-                                                        year_and_month, editor_id)].reset_index(drop=True)
-
-            # Classification and merge.
-            selected_source = selected_source_tokens.groupby(["token_id"]).agg({"rev_id": "count"}).rename({"rev_id": "revisions"}, axis=1)
-            selected_conflicts = selected_conflict_tokens.groupby(["token_id"]).agg({"action": "count", 
-                                                             "conflict": "sum"}).rename({"action": "conflicts"}, axis=1)
-
-            selected_elegibles = selected_elegible_tokens.groupby(["token_id"]).agg({"action": "count"}).rename({"action": "elegibles"}, axis=1)
-
-            selected_elegibles = selected_elegibles.merge(selected_source, on="token_id")
-
-            in_out = self.__count_in_out(selected_source_tokens)
-            selected_elegibles = selected_elegibles.merge(in_out, on="token_id")
-
-            selected_df = selected_conflicts.merge(selected_elegibles, on="token_id", how="right")
-            selected_df["conflict"] = selected_df["conflict"] / selected_df["elegibles"]
-            selected_df = selected_df.fillna(0)
-            selected_df = selected_df.merge(selected_elegible_tokens[["token_id", "token"]].drop_duplicates().set_index("token_id"), 
-                            on="token_id")[["token", "elegibles", "conflicts", "conflict", "revisions", "in_actions", "out_actions"]]
-            selected_df = selected_df[selected_df["conflict"] != 0]
+            # Conflicting tokens of the selected editor and day.
+            if self.token_summary is None:
+                self.token_summary = self.__get_token_summary()
+            selected_day = pd.Timestamp(*year_and_month)
+            if (selected_day, editor_id) in self.token_summary.index:
+                selected_df = self.token_summary.loc[(selected_day, editor_id)]
+            else:
+                selected_df = self.token_summary.iloc[:0].droplevel([0, 1])
             
-
             # Find the main opponent for each token.
             editor_to_id = self.get_editor_month()[["editor_id", "name"]]
             editor_id_dict = dict(zip(editor_to_id["editor_id"], editor_to_id["name"]))
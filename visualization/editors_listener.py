@@ -1,5 +1,5 @@
-import calendar
-from datetime import date, timedelta
+from collections import OrderedDict
+from datetime import timedelta
 import pandas as pd
 import numpy as np
 
@@ -14,23 +14,18 @@ from ipywidgets import Output
 from external.ores import ORESAPI, ORESDV
 
 # Auxiliary functions for date manipulating.
-def week_get_sunday(some_ts):
-    return some_ts + timedelta(days=6 - some_ts.weekday())
-
-def get_last_date_month(some_ts):
-    year = some_ts.year
-    month = some_ts.month
-    day = calendar.monthrange(year, month)[1]
-    
-    return date(year, month, day)
-
-def get_same_day(some_ts):
-    return date(some_ts.year, some_ts.month, some_ts.day)
-
 def mark_last_day(df):
-    df["last_day_month"] = df["rev_time"].dt.date.apply(get_last_date_month)
-    df["last_day_week"] = df["rev_time"].dt.date.apply(week_get_sunday)
-    df["this_day"] = df["rev_time"].dt.date.apply(get_same_day)
+    """Label each action with the last day of its month, the last day (Sunday) of its week
+    and its own day, as datetime64 columns.
+    """
+    rev_time = df["rev_time"]
+    if rev_time.dt.tz is not None:
+        rev_time = rev_time.dt.tz_localize(None)
+    this_day = rev_time.dt.floor("D")
+
+    df["last_day_month"] = this_day + pd.offsets.MonthEnd(0)
+    df["last_day_week"] = this_day + pd.to_timedelta(6 - this_day.dt.weekday, unit="D")
+    df["this_day"] = this_day
 
 # Other auxiliary functions.
 def merged_tokens_and_elegibles(elegibles, tokens, drop=False):
@@ -94,6 +89,17 @@ def fill_first_out(df):
 
     df.loc[idx_first_out, "time_diff"] = timediff_first_out
     df.loc[idx_first_out, "conflict"] = scores_first_out
+
+def get_opponent_actions(elegibles, tokens, lng):
+    """Merge all actions and elegible actions without stopwords, mark the time frames of each
+    action and fill the first deletions. Both the opponents info and the revision analysis are
+    based on this table, so it is built once and shared.
+    """
+    actions = merged_tokens_and_elegibles(remove_stopwords(elegibles, lng), remove_stopwords(tokens, lng))
+    mark_last_day(actions)
+    fill_first_out(actions)
+
+    return actions
     
 
 class EditorsListener:
@@ -114,6 +120,8 @@ class EditorsListener:
                through wiki API.
     revision_manager (object): RevisionsManger defined below, utilized to display the second table.
     search_widget (object): the widget used in A2.3, automatically being filled with selected_rev.
+    conflict_graph (pd.DataFrame): editor vs opponent conflict scores, actions and reaction times per
+               day, created by get_conflict_graph() method.
     gran_dict (dict): dictionary storing opponents' info and average reaction time, created by 
                sort_by_granularity() method.
     rev_comments (dict): {revision id: comment to this revision}, created by get_comments() method.
@@ -146,61 +154,42 @@ class EditorsListener:
         """
         Run this method before creating listener.
         """
-        monthly_dict = self._get_monthly_summary(remove_stopwords(self.all_tokens, self.lng))
         print("Calculating...")
-        opponent_info = self._calculate(monthly_dict)
+        opponent_info = self._calculate()
+        # The frames may have been replaced since the last call.
+        self.revision_manager.agg_actions = self.df
+        self.revision_manager.all_elegibles = self.all_elegibles
+        self.revision_manager.all_tokens = self.all_tokens
         self.revision_manager.opponents_info = opponent_info
-        self._sort_by_granularity(opponent_info)
+        self.revision_manager.clear_caches()
+        self.conflict_graph = self._get_conflict_graph(opponent_info)
+        self._sort_by_granularity(self.conflict_graph)
         
         clear_output()
-        
-    def _get_monthly_summary(self, tokens_source):
-        """
-        Who created which revisions in each month.
-        ...
-        Parameters:
-        -----------
-        tokens_source (pd.DataFrame): all_tokens without stopwords (could also be with stopwords).
-        ...
-        Returns:
-        -----------
-        retrieval_dict (dict): e.g. {(Period('2005-03', 'M') <-- year-month, '162969' <-- editor_id): ['12053908'] <-- rev_ids,...}
-        """
-        no_dup_tokens = tokens_source.drop_duplicates(["rev_id", "rev_time"]).reset_index(drop=True)
-        no_dup_tokens["rev_id"] = no_dup_tokens["rev_id"].astype(str)
-        no_dup_tokens = no_dup_tokens.sort_values("rev_time").reset_index(drop=True)
-        no_dup_tokens["mark_month"] = no_dup_tokens["rev_time"].astype("datetime64[ns]").dt.to_period('M')
-        no_dup_tokens["mark"] = list(zip(no_dup_tokens["mark_month"], no_dup_tokens["editor"]))
-
-        merge_tokens = no_dup_tokens[["mark", "rev_id"]]
-        retrieval_dict = dict(merge_tokens.groupby("mark")["rev_id"].apply(list))
-
-        return retrieval_dict
             
-    def _get_opponents(self, revs_list, tokens_df):
+    def _get_opponents(self, tokens_df):
         """
         See calculate()
         ...
         Parameters:
         -----------
-        revs_list (list): list of revision ids after stopwords being removed.
         tokens_df (pd.DataFrame): merged all_actions all_elegibles dataframe, with other 
-                    additional time frame information.
+                    additional time frame information, sorted by token and time.
         ...
         Returns:
         ------------
         final (pd.DataFrame): see opponent_info in calculate.
         """
-        # Filter out the tokens edited by this editor in those revs.
-        mask_rev = tokens_df["revision"].isin(revs_list)
-        conflicts_filter = tokens_df.loc[mask_rev].dropna()  # .dropna() aims to eliminate self-editing
-
-        # Get tokens info of its opponents
-        opponent_idx = conflicts_filter.index - 1
-        opponent_df = tokens_df.loc[opponent_idx]
+        # The opponent is the editor of the previous action on the same token.
+        opponent_df = pd.DataFrame({"editor": tokens_df["editor"].shift(1),
+                              "oppo_time": tokens_df["rev_time"].shift(1)})
+        
+        # Keep the tokens with conflict information; this also eliminates self-editing.
+        mask_conflict = tokens_df.notnull().all(axis=1)
+        conflicts_filter = tokens_df.loc[mask_conflict]
 
         # Merge the infos we need
-        opponent_part = opponent_df[["editor", "rev_time"]].rename({"rev_time": "oppo_time"}, axis=1).reset_index(drop=True)
+        opponent_part = opponent_df.loc[mask_conflict].reset_index(drop=True)
         idx_part = conflicts_filter[["token_id", "conflict", "rev_time",
                             "revision", "time_diff", "editor",
                             "last_day_month", "last_day_week", "this_day"]].rename({"rev_time": "edit_time",
@@ -210,14 +199,9 @@ class EditorsListener:
 
         return final    
     
-    def _calculate(self, monthly_tokens):
+    def _calculate(self):
         """
-        Given revision list of each editor grouped in each month, get the detailed
-        opponent information of each token. Core method: get_opponents()
-        ...
-        Parameters:
-        -----------
-        monthly_tokens (dict): Output of get_monthly_summary() method.
+        Get the detailed opponent information of each token. Core method: get_opponents()
         ...
         Returns:
         -----------
@@ -227,39 +211,49 @@ class EditorsListener:
                         conflict score, revision, time interval, last day of this 
                         month/week/day, in which the original editing lies.
         """
-        # An empty dict to store opponents.
-        opponent_dict = {}
-        
-        # Merge all revision ids from monthly token dict into one list.
-        all_revs = sum(monthly_tokens.values(), [])
-        
-        # Remove stopwords from all actions and elegible actions.
-        tokens_no_stopwords = remove_stopwords(self.all_tokens, self.lng)
-        elegibles_no_stopwords = remove_stopwords(self.all_elegibles, self.lng)
-        
-        # Merge the above table together thus we can use time diff and conflict score
-        # information from elegible actions table.
-        actions = merged_tokens_and_elegibles(elegibles_no_stopwords, tokens_no_stopwords)
-        
-        # Mark last day of this month/week/day
-        mark_last_day(actions)
-        
-        # Fill time_diff, conflict for the first deletion, since this action is not considered
-        # in ConflictManager.all_elegibles.
-        fill_first_out(actions)
+        # Merge all actions and elegible actions without stopwords, so we can use time diff and
+        # conflict score information from elegible actions table. The last day of this month/week/day
+        # is marked and time_diff, conflict are filled for the first deletion, since this action is 
+        # not considered in ConflictManager.all_elegibles. The table is shared with the revision manager.
+        actions = get_opponent_actions(self.all_elegibles, self.all_tokens, self.lng)
+        self.revision_manager.actions = actions
         
         # Get final opponents info through get_opponents() method.
-        opponent_info = self._get_opponents(all_revs, actions)
+        opponent_info = self._get_opponents(actions)
                         
         return opponent_info
     
-    def _sort_scores(self, oppo_info, col):
-        "Aggregate conflict scores."
+    def _get_conflict_graph(self, oppo_info):
+        """
+        Editor vs opponent conflict graph. Each edge is an (editor, opponent, day) with the summed
+        conflict score, the number of actions and the summed reaction time; the editors that never
+        conflict with each other have no edge. Weekly and monthly values are sums of daily edges.
+        ...
+        Parameters:
+        -----------
+        oppo_info (pd.DataFrame): Opponents dataframe got by calculate() method.
+        ...
+        Returns:
+        -----------
+        graph (pd.DataFrame): |idx_editor|editor|conflict|actions|time_diff|last_day_month|last_day_week|this_day|
+        """
         # If the opponent is editor himself, then exclude it.
         oppo_info = oppo_info[oppo_info["editor"] != oppo_info["idx_editor"]]
         
+        graph = oppo_info.groupby(["idx_editor", "editor", "this_day"]).agg(conflict=("conflict", "sum"),
+                                                          actions=("time_diff", "count"),
+                                                          time_diff=("time_diff", "sum")).reset_index()
+        
+        # Mark last day of this month/week of each daily edge.
+        graph = graph.rename({"this_day": "rev_time"}, axis=1)
+        mark_last_day(graph)
+        
+        return graph.drop("rev_time", axis=1)
+    
+    def _sort_scores(self, graph, col):
+        "Aggregate conflict scores."
         # Aggregate conflict scores for each editor and its opponent in each time frame.
-        group_df = oppo_info.groupby(["idx_editor",
+        group_df = graph.groupby(["idx_editor",
                             "editor",
                              col]).agg({"conflict": "sum"}).reset_index().rename({col: "bench_date"}, axis=1)
         
@@ -267,29 +261,30 @@ class EditorsListener:
         sort_df = group_df.sort_values(["idx_editor", "conflict"], ascending=[True, False])
         sort_df = sort_df.drop_duplicates(["idx_editor", "bench_date"]).sort_values("bench_date").reset_index(drop=True)
         sort_df = sort_df.rename({"idx_editor": "editor_id", "editor": "main_opponent", "bench_date": "rev_time"}, axis=1)
+        sort_df["rev_time"] = sort_df["rev_time"].dt.date
         df_display = sort_df[["editor_id", "main_opponent", "rev_time"]]
         
         return df_display
     
-    def _avg_reac(self, oppo_info, col):
+    def _avg_reac(self, graph, col):
         "Calculate average response reaction time."
-        # If the opponent is editor himself, then exclude it.
-        oppo_info = oppo_info[oppo_info["editor"] != oppo_info["idx_editor"]]
-        
         # Calculate reverage response time for each editor.
-        avg_reac_display = oppo_info.groupby(["idx_editor", 
-                    col])["time_diff"].agg(lambda x: str(x.mean()).split('.')[0]).reset_index().rename({col: "rev_time",                          "time_diff":"avg_reac_time","idx_editor":"editor_id"},axis=1).sort_values("rev_time").reset_index(drop=True)
+        reac = graph.groupby(["idx_editor", col]).agg({"time_diff": "sum", "actions": "sum"})
+        avg_reac = (reac["time_diff"] / reac["actions"]).apply(lambda x: str(x).split('.')[0])
+        avg_reac_display = avg_reac.rename("avg_reac_time").reset_index().rename({col: "rev_time",
+                                                 "idx_editor":"editor_id"},axis=1).sort_values("rev_time").reset_index(drop=True)
+        avg_reac_display["rev_time"] = avg_reac_display["rev_time"].dt.date
         
         return avg_reac_display
                
-    def _sort_by_granularity(self, oppo_info):
+    def _sort_by_granularity(self, graph):
         """
         Sort the opponents info by month/week/day and calcalute average reaction time
         for each time frame.
         ...
         Parameters:
         -----------
-        oppo_info (pd.DataFrame): Opponents dataframe got by calculate() method.
+        graph (pd.DataFrame): Conflict graph got by get_conflict_graph() method.
         ...
         Returns:
         -----------
@@ -297,14 +292,14 @@ class EditorsListener:
                         each time frame.
         """
         # Aggregate conflict scores.
-        month_opponent = self._sort_scores(oppo_info, "last_day_month")
-        week_opponent = self._sort_scores(oppo_info, "last_day_week")
-        daily_opponent = self._sort_scores(oppo_info, "this_day")
+        month_opponent = self._sort_scores(graph, "last_day_month")
+        week_opponent = self._sort_scores(graph, "last_day_week")
+        daily_opponent = self._sort_scores(graph, "this_day")
         
         # Average response reaction time.
-        month_avg_rec = self._avg_reac(oppo_info, "last_day_month")
-        week_avg_rec = self._avg_reac(oppo_info, "last_day_week")
-        daily_avg_rec = self._avg_reac(oppo_info, "this_day")
+        month_avg_rec = self._avg_reac(graph, "last_day_month")
+        week_avg_rec = self._avg_reac(graph, "last_day_week")
+        daily_avg_rec = self._avg_reac(graph, "this_day")
 
         self.gran_dict = {"Monthly": [month_opponent, month_avg_rec],
                  "Weekly": [week_opponent, week_avg_rec],
@@ -458,23 +453,47 @@ class RevisionsManager:
     all_elegibles (pd.DataFrame): elegibles actions (including stopwords) from ConflictManager.
     all_tokens (pd.DataFrame): actions occurring on all tokens, including stopwords, from ConflictManager.
     opponents_info (pd.DataFrame): Opponents information derived from EditorsListener.__calculate().
+    actions (pd.DataFrame): actions without stopwords merged with elegible actions, see get_opponent_actions().
+    rev_index (pd.DataFrame): main opponent and min reaction time of every revision, by revision.
+    agg_with_revs (pd.DataFrame): output of _add_revision_id(), built at the first selection.
+    ores_scores (pd.DataFrame): ORES scores of the revisions already requested.
+    main_cache (OrderedDict): results of get_main() by (editor, date, freq), least recently used first.
+    max_cached (int): maximum number of results kept in main_cache.
     lng (str): langauge from {'en', 'de'}
     """
     
-    def __init__(self, agg, all_elegibles, all_tokens, opponents_info, lng):
+    def __init__(self, agg, all_elegibles, all_tokens, opponents_info, lng, max_cached=32):
         self.agg_actions = agg
         self.names_dict = agg[["editor_str", "editor"]].drop_duplicates().set_index("editor_str")["editor"].to_dict()
         
         self.all_elegibles = all_elegibles
         self.all_tokens = all_tokens
         self.opponents_info = opponents_info
+        self.actions = None
+        self.rev_index = None
         
         self.lng=lng
         
+        # Caches for the selections.
+        self.agg_with_revs = None
+        self.ores_scores = pd.DataFrame(columns=["rev_id", "Damaging", "Goodfaith"])
+        self.main_cache = OrderedDict()
+        self.max_cached = max_cached
+        
+        
+    def clear_caches(self):
+        """Called when the infos are recalculated. Drop everything derived from the previous
+        actions and opponents info; ORES scores are kept, they only depend on the revision.
+        """
+        self.rev_index = None
+        self.agg_with_revs = None
+        self.main_cache.clear()
+        
         
     def get_main(self, selected_date, selected_editor, freq):
         """
         Called in EditorsListener.on_select_change(). Merge several tables with different metrics.
+        The last max_cached results are kept, so selecting a row again does not recompute it.
         ...
         Parameters:
         -----------
@@ -486,14 +505,27 @@ class RevisionsManager:
         --------
         df_merge2 (pd.DataFrame): the second table in A2.1.
         """
-        agg = self._add_revision_id()
+        key = (selected_editor, selected_date, freq)
+        if key in self.main_cache:
+            self.main_cache.move_to_end(key)
+            return self.main_cache[key].copy()
+        
+        if self.agg_with_revs is None:
+            self.agg_with_revs = self._add_revision_id()
+        agg = self.agg_with_revs
         filtered_df = self._get_filtered_df(agg, selected_date, selected_editor, freq).reset_index(drop=True)
         df_ratios = self._get_ratios(filtered_df).reset_index()
         df_opponents = self._get_rev_conflict_reac(df_ratios)
         df_merge1 = df_ratios.merge(df_opponents, on="rev_id", how="left")
         df_ores = self._get_ores(df_merge1)
         df_merge2 = df_merge1.merge(df_ores, on="rev_id", how="left").set_index("rev_time")
-        return df_merge2
+        
+        # Keep the result, dropping the least recently used one if the cache is full.
+        self.main_cache[key] = df_merge2
+        if len(self.main_cache) > self.max_cached:
+            self.main_cache.popitem(last=False)
+        
+        return df_merge2.copy()
         
     def _add_revision_id(self):
         """
@@ -580,36 +612,31 @@ class RevisionsManager:
         return to_display
     
     
-    def _get_most_conflict_from_rev(self, rev_df):
+    def _get_most_conflict_by_rev(self):
         """
         Called in get_rev_conflict_reac() method.
-        Analyse the main opponent and min reaction time for each revision.
-        ...
-        Parameters:
-        -----------
-        rev_df (pd.DataFrame): actions without stopwords of a particular revision.
+        Analyse the main opponent and min reaction time of all revisions at once.
         ...
         Returns:
         -----------
-        main_opponent (str): main opponent's name.
-        min_react (str): minimum reaction time.
+        rev_index (pd.DataFrame): indexed by revision (str), with columns main_opponent
+                        (main opponent's name) and min_react (minimum reaction time, str).
         """
-        # Sort conflict score in desc order and find the fastest response.
-        sort_rev = rev_df.sort_values("conflict", ascending=False)
-        min_react = str(sort_rev.iloc[0]["time_diff"])
-        
-        # Find the main opponent.
-        rev_id = rev_df["revision"].unique()[0]
-        editor = rev_df["editor"].unique()[0]
-        period = rev_df["rev_time"].astype("datetime64[ns]").dt.to_period('M').unique()[0]
-        mask_date = self.opponents_info["edit_time"].astype("datetime64[ns]").dt.to_period('M') == period
-        mask_editor = self.opponents_info["idx_editor"] == editor
-        opponent_info = self.opponents_info[mask_date & mask_editor]
-        opponent_info = opponent_info[opponent_info["revision"] == rev_id]
-        main_opponent_id = opponent_info.groupby(["editor"]).agg({"conflict": "sum"}).sort_values("conflict", ascending=False).iloc[0].name
-        main_opponent = self.names_dict[main_opponent_id]
-
-        return main_opponent, min_react
+        # Only the actions with conflict scores (also the first deletions).
+        actions = self.actions.dropna(subset=["conflict"])
+        
+        # The fastest response is the action with the highest conflict score of each revision.
+        top_actions = actions.sort_values("conflict", ascending=False, kind="mergesort").drop_duplicates("revision")
+        min_react = top_actions.set_index("revision")["time_diff"].astype(str).rename("min_react")
+        
+        # The main opponent is the editor that sums the highest conflict score in each revision.
+        opponent_scores = self.opponents_info.groupby(["revision", "editor"]).agg({"conflict": "sum"}).reset_index()
+        main_opponents = opponent_scores.sort_values("conflict", ascending=False, kind="mergesort").drop_duplicates("revision")
+        main_opponent = main_opponents.set_index("revision")["editor"].map(self.names_dict).rename("main_opponent")
+        
+        rev_index = pd.concat([main_opponent, min_react], axis=1, join="inner")
+        
+        return rev_index
     
     
     def _get_rev_conflict_reac(self, df_agg):
@@ -626,25 +653,27 @@ class RevisionsManager:
         """
         # Revisions array.
         #df_agg = df_agg.loc[~(df_agg["conflict"] == 0)]
-        second_revs = df_agg["rev_id"].values
+        second_revs = df_agg["rev_id"].reset_index(drop=True)
         
         # Only consider non-stopwords.
-        rev_conflicts = pd.DataFrame(columns=["rev_id", "main_opponent", "min_react"])
-        actions_exc_stop = remove_stopwords(merged_tokens_and_elegibles(self.all_elegibles, self.all_tokens), self.lng).reset_index(drop=True)
+        # Also consider the first deletion (that is not considered in elegible actions).
+        if self.actions is None:
+            self.actions = get_opponent_actions(self.all_elegibles, self.all_tokens, self.lng)
         
-        # Mark the last day of each time frame.
-        mark_last_day(actions_exc_stop)
+        # Analyse all the revisions of the page once, then only look them up.
+        if self.rev_index is None:
+            self.rev_index = self._get_most_conflict_by_rev()
         
-        # Also consider the first deletion (that is not considered in elegible actions).
-        fill_first_out(actions_exc_stop)
-        
-        # For each revision analyse the main opponent using get_most_conflict_from_rev method.
-        for idx, rev in enumerate(second_revs):
-            some_rev = actions_exc_stop[actions_exc_stop["revision"] == rev]
-            some_rev = some_rev.dropna(subset=["conflict"])
-            if len(some_rev) != 0:
-                self.problem_rev = some_rev
-                rev_conflicts.loc[idx] = [rev] + list(self._get_most_conflict_from_rev(some_rev))
+        # Revisions are stored as strings.
+        if pd.api.types.is_numeric_dtype(second_revs):
+            rev_keys = second_revs.astype("Int64").astype(str)
+        else:
+            rev_keys = second_revs.astype(str)
+        found = rev_keys.isin(self.rev_index.index)
+        
+        rev_conflicts = self.rev_index.loc[rev_keys[found]].reset_index(drop=True)
+        rev_conflicts.insert(0, "rev_id", second_revs[found].values)
+        rev_conflicts.index = second_revs[found].index
                 
         return rev_conflicts
     
@@ -663,19 +692,20 @@ class RevisionsManager:
         -----------
         ores_df (pd.DataFrame): df storing scores.
         """
-        # Revsion list
+        # Revsion list, only the revisions whose scores were not requested before.
         revs_list = merge1["rev_id"].values
+        new_revs = pd.unique(revs_list[~pd.Series(revs_list).astype(int).isin(self.ores_scores["rev_id"]).values])
         
         # Use ORES API
-        ores_dv = ORESDV(ORESAPI(lng=self.lng))
-        if len(revs_list) > 50:
-            revs_container = []
-            for chunk in self._split_arr(revs_list):
+        if len(new_revs) > 0:
+            ores_dv = ORESDV(ORESAPI(lng=self.lng))
+            revs_container = [self.ores_scores]
+            for chunk in self._split_arr(new_revs):
                 chunk_df = ores_dv.get_goodfaith_damage(chunk)
                 revs_container.append(chunk_df)
-            ores_df = pd.concat(revs_container).reset_index(drop=True)
-        else:
-            ores_df = ores_dv.get_goodfaith_damage(revs_list)
+            self.ores_scores = pd.concat(revs_container).reset_index(drop=True)
+        
+        ores_df = self.ores_scores[self.ores_scores["rev_id"].isin(pd.Series(revs_list).astype(int))].reset_index(drop=True)
         
         return ores_df
     
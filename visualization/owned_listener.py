@@ -6,31 +6,24 @@ import plotly
 from plotly import graph_objs
 from IPython.display import display, Markdown as md
 
+from metrics.ownership import OwnershipManager
+
 class OwnedListener():
 
     def __init__(self, df, editor):
-        self.df = df.sort_values(['token_id', 'rev_time'], ascending=True).set_index('token_id')
+        self.df = df
         self.editor = editor
 
         self.days = df.loc[df['o_editor'] == editor, 'rev_time'
             ].dt.tz_localize(None).dt.to_period('D').unique()
         today = pd.Period(datetime.datetime.today(), freq='D')
         self.days = pd.Series(np.append(self.days, today)).sort_values(ascending=False)
-        self.df['rev_time'] = pd.to_datetime(self.df['rev_time']).dt.tz_localize(None)
 
         if len(self.days) > 0:
             self.days = self.days.dt.to_timestamp('D') + pd.DateOffset(1)
 
-            _all = []
-            _abs = []
-            df = self.df
-            for rev_time in self.days:
-                
-                df = df[df['rev_time'] <= rev_time]
-                last_action = df.groupby('token_id').last()
-                surv = last_action[last_action['action'] != 'out']
-                _abs.append(sum(surv['o_editor'] == self.editor))
-                _all.append(len(surv))
+            # Owned and present tokens at the end of each day, in a single sweep over the actions.
+            _abs, _all = OwnershipManager(df).get_owned(self.editor, self.days.values)
 
             self.summ = pd.DataFrame({
                 'day': self.days,
@@ -5,7 +5,8 @@ from datetime import datetime, timedelta
 import plotly.figure_factory as ff
 import qgrid
 import re
-from tqdm import tqdm
+
+from .templates_patterns import PROTECT_PAIRS_PATTERN, PROTECT_TRAILING_PATTERN, TEMPLATE_DIFF_PATTERN
 
 
 class ProtectListener():
@@ -20,6 +21,7 @@ class ProtectListener():
         lng (str): langauge from {'en', 'de'}
         inf_str / exp_str (str): "indefinite" / "expires" for English
                         "unbeschränkt" / "bis" for Deutsch
+        exp_pattern (re.Pattern): captures the date following exp_str.
         """
         self.lng = lng
         self.df = pp_log
@@ -34,6 +36,7 @@ class ProtectListener():
             display(md("This language is not supported yet."))
             self.inf_str = "indefinite"
             self.exp_str = "expires"
+        self.exp_pattern = re.compile(f"{self.exp_str} (.*?) \\(UTC")
         
     def get_protect(self, level="semi_edit"):
         """
@@ -69,107 +72,43 @@ class ProtectListener():
         return final_table, plot_table
         
         
-    def _regrex1(self, captured_content):
-        """Called in _get_expiry() method. Capture expriry date.
+    def _extract_date(self, date_content):
+        """Called in _get_expiry(). Extract expiry dates.
+        If inf, then return max Timestamp of pandas (to the minute).
         ...
         Parameters:
         -----------
-        captured_content (str): contents in "params" or "comment" column
-                    including "autoconfirmed" or "sysop".
+        date_content (pd.Series): expiry part of the entries, like 'indefinite' or
+                    'expires 22:12, 26 August 2007 (UTC'.
         ...
         Returns:
         -----------
-        reg0 (list): A list like [('edit=autoconfirmed', 'indefinite'), ('move=sysop', 'indefinite')]
-                or [('edit=autoconfirmed:move=autoconfirmed', 'expires 22:12, 26 August 2007 (UTC')]
+        expiry (pd.Series): expiry dates, NaT if they can not be parsed.
         """
-        reg0 = re.findall('\[(.*?)\]\ \((.*?)\)', captured_content)
-        return reg0
-
-    
-    def _regrex2(self, captured_content):
-        "Called in _get_expiry() method. Capture expriry date. Parameters and returns similar as _regrex1."
-        reg0 = re.findall('\[(.*?)\:(.*?)\]$', captured_content)
-        reg1 = re.findall('\[(.*?)\]$', captured_content)
-        if len(reg0) != 0:
-            reg0[0] = (reg0[0][0] + ":" + reg0[0][1], self.inf_str)
-            return reg0
-        else:
-            try:
-                reg1[0] = (reg1[0], self.inf_str)
-            except:
-                pass
+        extract_str = date_content.str.extract(self.exp_pattern, expand=False)
+        
+        # Try the formats in order, the last ones after translating the month names.
+        expiry = pd.Series(pd.NaT, index=date_content.index, dtype="datetime64[ns]")
+        for date_format in ("%H:%M, %d %B %Y", "%H:%M, %B %d, %Y"):
+            expiry = expiry.fillna(pd.to_datetime(extract_str, format=date_format, errors="coerce"))
+        extract_str = self._month_lng(extract_str)
+        for date_format in ("%H:%M, %d. %b. %Y", "%d. %B %Y, %H:%M Uhr"):
+            expiry = expiry.fillna(pd.to_datetime(extract_str, format=date_format, errors="coerce"))
             
-            return reg1
-
-        
-    def _extract_date(self, date_content):
-        """Called in _check_state(). Extract expiry date.
-        If inf, then return max Timestamp of pandas.
-        """
-        if not self.inf_str in date_content:
-            extract_str = re.findall(f'{self.exp_str}\ (.*?)\ \(UTC', date_content)[0]              
-            return extract_str
-        else:
-            return (pd.Timestamp.max).to_pydatetime(warn=False).strftime("%H:%M, %-d %B %Y")
-        
+        expiry[date_content.str.contains(self.inf_str, regex=False)] = pd.Timestamp.max.floor("min")
         
-    def _check_state(self, extract):
-        """
-        Called in _get_expiry().
-        Given a list of extracted expiry date, further label it using 
-        protection type ({edit, move}) and level (semi (autoconfirmed) or full (sysop)).      
-        ...
-        Parameters:
-        -----------
-        extract (list): output of _regrex1 or _regrex2
-        ...
-        Returns:
-        -----------
-        states_dict (dict): specify which level and which type, and also 
-                    respective expiry date.
-        """
-        states_dict = {"autoconfirmed_edit": 0, "expiry1": None,
-                  "autoconfirmed_move": 0, "expiry11": None,
-                  "sysop_edit": 0, "expiry2": None,
-                  "sysop_move": 0, "expiry21": None}
-        
-        len_extract = len(extract)
-        for i in range(len_extract):
-            action_tup = extract[i]
-            mask_auto_edit = "edit=autoconfirmed" in action_tup[0]
-            mask_auto_move = "move=autoconfirmed" in action_tup[0]
-            mask_sysop_edit = "edit=sysop" in action_tup[0]
-            mask_sysop_move = "move=sysop" in action_tup[0]
-
-            if mask_auto_edit:
-                states_dict["autoconfirmed_edit"] = int(mask_auto_edit)
-                states_dict["expiry1"] = self._extract_date(action_tup[1])
-            if mask_auto_move:
-                states_dict["autoconfirmed_move"] = int(mask_auto_move)
-                states_dict["expiry11"] = self._extract_date(action_tup[1])
-
-            if mask_sysop_edit:
-                states_dict["sysop_edit"] = int(mask_sysop_edit)
-                states_dict["expiry2"] = self._extract_date(action_tup[1])
-            if mask_sysop_move:
-                states_dict["sysop_move"] = int(mask_sysop_move)
-                states_dict["expiry21"] = self._extract_date(action_tup[1])
-    
-        return states_dict
+        return expiry
     
     
     def _month_lng(self, string):
-        """Called in _get_expiry. Substitute non-english month name with english one.
+        """Called in _extract_date(). Substitute non-english month names with english ones.
         For now only support DE.
         """
         if self.lng == "de":
             de_month = {"März": "March", "Dezember": "December", "Mär": "Mar", "Mai": "May", "Dez": "Dec", "Januar": "January", 
                     "Februar": "February", "Juni": "June", 
                     "Juli": "July", "Oktobor": "October"}
-            for k, v in de_month.items():
-                new_string = string.replace(k, v)
-                if new_string != string:
-                    break
+            new_string = string.str.replace("|".join(de_month), lambda month: de_month[month.group(0)], regex=True)
                 
             return new_string
         else:
@@ -189,94 +128,38 @@ class ProtectListener():
         self.test_log = protect_log
         
         # Convert timestamp date format.
-        protect_log["timestamp"] = protect_log["timestamp"].apply(lambda x: datetime.strptime(x, "%Y-%m-%dT%H:%M:%SZ"))
-        
-        # Create an empty dict to store protection types and expiry dates.
-        expiry = {}
-        
-        # First check "params" column.
-        if "params" in protect_log.columns:
-            for idx, com in protect_log['params'].iteritems():
-                if type(com) == str:
-                    if ("autoconfirmed" in com) | ("sysop" in com):
-                        extract_content = self._regrex1(com) if len(self._regrex1(com)) != 0 else self._regrex2(com)
-                        expiry[idx] = self._check_state(extract_content)  # Which type it belongs to?
-                    else:
-                        pass
-                else:
-                    pass
-        
-        # Then check "comment" column.
-        for idx, com in protect_log['comment'].iteritems():
-            if ("autoconfirmed" in com) | ("sysop" in com):
-                extract_content = self._regrex1(com) if len(self._regrex1(com)) != 0 else self._regrex2(com)
-                expiry[idx] = self._check_state(extract_content)  # Which type it belongs to?
-            else:
-                pass
-        
-        # Fill expiry date into the dataframe.
-        for k, v in expiry.items():
-            protect_log.loc[k, "autoconfirmed_edit"] = v["autoconfirmed_edit"]
-
-            if v["expiry1"] != None:
-                try:
-                    protect_log.loc[k, "expiry1"] = datetime.strptime(v["expiry1"], "%H:%M, %d %B %Y")
-                except:
-                    try:
-                        protect_log.loc[k, "expiry1"] = datetime.strptime(v["expiry1"], "%H:%M, %B %d, %Y")
-                    except:
-                        v["expiry1"] = self._month_lng(v["expiry1"])
-                        try:
-                            protect_log.loc[k, "expiry1"] = datetime.strptime(v["expiry1"], "%H:%M, %d. %b. %Y")
-                        except:
-                            protect_log.loc[k, "expiry1"] = datetime.strptime(v["expiry1"], "%d. %B %Y, %H:%M Uhr")
-                            
-            protect_log.loc[k, "autoconfirmed_move"] = v["autoconfirmed_move"]
-                            
-            if v["expiry11"] != None:
-                try:
-                    protect_log.loc[k, "expiry11"] = datetime.strptime(v["expiry11"], "%H:%M, %d %B %Y")
-                except:
-                    try:
-                        protect_log.loc[k, "expiry11"] = datetime.strptime(v["expiry11"], "%H:%M, %B %d, %Y")
-                    except:
-                        v["expiry11"] = self._month_lng(v["expiry11"])
-                        try:
-                            protect_log.loc[k, "expiry11"] = datetime.strptime(v["expiry11"], "%H:%M, %d. %b. %Y")
-                        except:
-                            protect_log.loc[k, "expiry11"] = datetime.strptime(v["expiry11"], "%d. %B %Y, %H:%M Uhr")
-
-            protect_log.loc[k, "sysop_edit"] = v["sysop_edit"]
-
-            if v["expiry2"] != None:
-                try:
-                    protect_log.loc[k, "expiry2"] = datetime.strptime(v["expiry2"], "%H:%M, %d %B %Y")
-                except:
-                    try:
-                        protect_log.loc[k, "expiry2"] = datetime.strptime(v["expiry2"], "%H:%M, %B %d, %Y")
-                    except:
-                        v["expiry2"] = self._month_lng(v["expiry2"])
-                        try:
-                            protect_log.loc[k, "expiry2"] = datetime.strptime(v["expiry2"], "%H:%M, %d. %b. %Y")
-                        except:
-                            protect_log.loc[k, "expiry2"] = datetime.strptime(v["expiry2"], "%d. %B %Y, %H:%M Uhr")
-                            
-            protect_log.loc[k, "sysop_move"] = v["sysop_move"]
-                            
-            if v["expiry21"] != None:
-                try:
-                    protect_log.loc[k, "expiry21"] = datetime.strptime(v["expiry21"], "%H:%M, %d %B %Y")
-                except:
-                    try:
-                        protect_log.loc[k, "expiry21"] = datetime.strptime(v["expiry21"], "%H:%M, %B %d, %Y")
-                    except:
-                        v["expiry21"] = self._month_lng(v["expiry21"])
-                        try:
-                            protect_log.loc[k, "expiry21"] = datetime.strptime(v["expiry21"], "%H:%M, %d. %b. %Y")
-                        except:
-                            protect_log.loc[k, "expiry21"] = datetime.strptime(v["expiry21"], "%d. %B %Y, %H:%M Uhr")
+        protect_log["timestamp"] = pd.to_datetime(protect_log["timestamp"], format="%Y-%m-%dT%H:%M:%SZ")
+        
+        # Entries mentioning a level, those in "comment" override those in "params".
+        content = pd.Series(np.nan, index=protect_log.index, dtype=object)
+        for col in ("params", "comment"):
+            if col in protect_log.columns:
+                # Object dtype, or .str fails on a column without any string (e.g. no comments).
+                entries = protect_log[col].where(protect_log[col].map(type) == str).astype(object)
+                content = entries.where(entries.str.contains("autoconfirmed|sysop").fillna(False), content)
+        content = content.dropna()
+        
+        # Pairs like ('edit=autoconfirmed', 'indefinite') or ('edit=autoconfirmed:move=autoconfirmed',
+        # 'expires 22:12, 26 August 2007 (UTC'); entries without any only have a trailing '[edit=sysop]'.
+        extract = content.str.extractall(PROTECT_PAIRS_PATTERN).rename({0: "types", 1: "date"}, axis=1)
+        no_pairs = content[~content.index.isin(extract.index.get_level_values(0))]
+        trailing = no_pairs.str.extract(PROTECT_TRAILING_PATTERN, expand=False).dropna().to_frame("types")
+        trailing["date"] = self.inf_str
+        trailing.index = pd.MultiIndex.from_arrays([trailing.index, np.zeros(len(trailing), dtype=int)])
+        extract = pd.concat([extract, trailing])
+        extract["expiry"] = self._extract_date(extract["date"])
+        
+        # Which type and level each entry belongs to, the last pair of each one gives the expiry date.
+        states = {"autoconfirmed_edit": ("edit=autoconfirmed", "expiry1"), "autoconfirmed_move": ("move=autoconfirmed", "expiry11"),
+                  "sysop_edit": ("edit=sysop", "expiry2"), "sysop_move": ("move=sysop", "expiry21")}
+        for state, (state_str, expiry_col) in states.items():
+            state_extract = extract[extract["types"].str.contains(state_str, regex=False)]
+            state_extract = state_extract[~state_extract.index.get_level_values(0).duplicated(keep="last")].droplevel(1)
+            
+            protect_log[state] = pd.Series(0, index=content.index)
+            protect_log.loc[state_extract.index, state] = 1
+            protect_log[expiry_col] = state_extract["expiry"]
                         
-        
         return protect_log
     
     
@@ -529,8 +412,7 @@ class ProtectListener():
 
         return protect_plot
 
-    
-    
+
 class TemplateListener():
     """
     Class to extract templates information from WikiWho and HTML content.
@@ -544,6 +426,8 @@ class TemplateListener():
     templates (list): the templates we are interested in.
     tl (list): first word of templates, in lowercase
     plot_protect (pd.DataFrame): plot dataframe from ProtectListener 
+    template_tokens (tuple): captured and suspicious tokens of all templates, see _scan_templates().
+    prev_revs (pd.Series): previous revision of each revision.
     """
     def __init__(self, all_actions, protection_plot, lng, wikipediadv_api, page):
         self.df = all_actions
@@ -561,6 +445,8 @@ class TemplateListener():
             
         self.tl = [tl.lower().split()[0] for tl in self.templates]        
         self.plot_protect = protection_plot
+        self.template_tokens = None
+        self.prev_revs = None
         
     def get_template(self, tl):
         """Called in listener().
@@ -577,74 +463,50 @@ class TemplateListener():
         self._get_diff(suspicious, captured) (pd.DataFrame): tokens in suspicous
                                    but not in captured.
         """
-        # Get template tokens whose ids are adjacent, also non-adjacent tokens as suspicious tokens.
-        match_rough2, match_rough = self._get_pattern(tl)
+        # All the templates are scanned at once, select this one.
+        all_captured, all_suspicious = self._scan_templates()
         
-        final_idx = match_rough2[match_rough2["final"] == 1].index.union(match_rough2[match_rough2["final"] == 1].index + 1)
-        match_rough3 = match_rough2.loc[final_idx]
-        
-        suspicious = match_rough[match_rough["token"] == tl].iloc[:, :11].drop(["index"], axis=1).reset_index(drop=True)
-        captured = match_rough3[match_rough3["token"] == tl].iloc[:, :11].drop(["index"], axis=1).reset_index(drop=True)
+        suspicious = all_suspicious[all_suspicious["token"] == tl].reset_index(drop=True)
+        captured = all_captured[all_captured["token"] == tl].reset_index(drop=True)
         
         return captured, suspicious, self._get_diff(suspicious, captured)
     
-    def _get_adjacent(self, tl):
-        """Called in _get_pattern().
-        Label adjacent '{{' and template name whose ids are adjacent.
+    def _scan_templates(self):
+        """Called in get_template(). Capture '{{template_name...' pattern for all
+        templates in one pass.
         ...
-        Parameters:
-        -----------
-        tl (str): first word of template, in lowercase form.
+        Template tokens are matched against the last '{{' before them (sorted by
+        revision time and token id); only the first token of each template after a '{{'
+        can follow it, and it does if their ids are adjacent.
         ...
         Returns:
         -----------
-        match_rough (pd.DataFrame): column "adjcent = 1" means these two tokens
-                        are adjacent; "{{ = 1" means token is "{{";
-                        "tl = 1" means token is template's name.
+        captured (pd.DataFrame): template tokens for sure, like 'good' in '{{','good',
+                        their ids are adjacent.
+        suspicious (pd.DataFrame): all template tokens, they are probably template tokens.
         """
-        # Sort by revision time and token id.
-        match_source = (self.df.copy()).sort_values(['rev_time', 'token_id'])
+        if self.template_tokens is not None:
+            return self.template_tokens
         
-        # Convert boolean to 0-1.
-        mask_symbol = (match_source['token'] == '{{').astype(int)
-        mask_str = (match_source['token'] == tl).astype(int)
-
-        # Label '{{' and template name and extract them.
-        match_source['{{'] = mask_symbol
-        match_source['tl'] = mask_str        
-        match_rough = match_source[(match_source['{{'] == 1) | (match_source['tl'] == 1)].reset_index()
+        # Sort only '{{' and template names by revision time and token id.
+        mask_tokens = (self.df["token"] == "{{") | self.df["token"].isin(self.tl)
+        match_rough = self.df.loc[mask_tokens, self.df.columns[:10]].sort_values(['rev_time', 'token_id']).reset_index(drop=True)
         
-        # Label adjacency.
-        mask_tokenid = ((match_rough.shift(-1)["token_id"] - match_rough["token_id"]) == 1).astype(int)
-        match_rough['adjcent'] = mask_tokenid
+        # Last '{{' before each template name.
+        mask_symbol = (match_rough["token"] == "{{").values
+        symbol_idx = np.flatnonzero(mask_symbol)
+        last_symbol = pd.DataFrame({"symbol": np.cumsum(mask_symbol) - 1, "token": match_rough["token"].values})[~mask_symbol]
         
-        return match_rough
-    
-    def _get_pattern(self, tl):
-        """Called in get_template(). Capture '{{template_name...' pattern.
-        ...
-        Parameters:
-        -----------
-        tl (str): first word of template, in lowercase form.
-        ...
-        Returns:
-        -----------
-        match_rough2 (pd.DataFrame): Template tokens, like '{{','good', their ids are adjacent.
-        match_rough (pd.DataFrame): column "adjcent = 1" means these two tokens
-                        are adjacent; "{{ = 1" means token is "{{";
-                        "tl = 1" means token is template's name.
-        """
-        match_rough = self._get_adjacent(tl)
-        
-        # Capture adjacent tokens.
-        adjcent_idx = match_rough[match_rough["adjcent"] == 1].index.union(match_rough[match_rough["adjcent"] == 1].index + 1)
-        match_rough2 = match_rough.loc[adjcent_idx]
+        # First name of each template after a '{{', captured if their ids are adjacent.
+        following = last_symbol[last_symbol["symbol"] >= 0].drop_duplicates(["symbol", "token"])
+        token_ids = match_rough["token_id"].values
+        mask_adjacent = (token_ids[following.index] - token_ids[symbol_idx[following["symbol"].values]]) == 1
         
-        # Only "{{" and template name are adjacent
-        match_rough2['sum'] = match_rough2['{{'] + match_rough2.shift(-1)['tl']
-        match_rough2['final'] = ((match_rough2["adjcent"] == 1) & (match_rough2["sum"] == 2)).astype(int)
+        captured = match_rough.loc[following.index[mask_adjacent]].reset_index(drop=True)
+        suspicious = match_rough.loc[~mask_symbol].reset_index(drop=True)
+        self.template_tokens = captured, suspicious
         
-        return match_rough2, match_rough
+        return self.template_tokens
     
     def _get_diff(self, df1, df2):
         """Called in get_template(). Get the elements in df2 but not
@@ -660,45 +522,53 @@ class TemplateListener():
         ...
         Parameters:
         -----------
-        current_rev (str): current revision.
+        current_rev (Union[str, array-like]): current revision(s).
         ...
         Returns:
         -----------
-        prev_rev (str): previous revision.
+        prev_rev (Union[str, pd.Series]): previous revision(s).
         """
-        loc_current_rev = np.where(self.token_rev_ids == current_rev)[0][0]
-        prev_rev = self.token_rev_ids[loc_current_rev - 1]
+        if self.prev_revs is None:
+            token_rev_ids = self.df.sort_values("rev_time", kind="mergesort")["rev_id"].unique()
+            self.prev_revs = pd.Series(np.roll(token_rev_ids, 1), index=token_rev_ids)
+        prev_rev = self.prev_revs[current_rev]
 
         return prev_rev
     
     
-    def _template_capturer(self, html_content, template):
-        """Called in get_missing_tl(). Capture template from HTML contents.
+    def _template_capturer(self, html_content):
+        """Called in get_missing_tl(). Capture templates from HTML contents.
+        ...
+        The diff is scanned once with TEMPLATE_DIFF_PATTERN; a template is captured when
+        a '{{' is followed by its name:
+        - at the start of an added (deleted) line, as it is or inside an <ins> (<del>) tag;
+        - anywhere, as it is and followed by ' article}}';
+        - after a link, inside an <ins> or <del> tag and followed by ' article}}'.
         ...
         Parameters:
         -----------
         html_content (str): revision difference content in HTML, extracted using
                 WikipediaDV.api.get_talk_rev_diff.
-        template (str): template name we want to detect.
         ...
         Returns:
         -----------
-        0: not missed; 1: missed
+        captured (set): first words of the templates found, in lowercase form.
         """
-        html_content = html_content.lower()
-        pat1 = f'<td class="diff-deletedline"><div>{{{{<del class="diffchange diffchange-inline">{template}</del> article}}}}'
-        pat2 = f'<td class="diff-addedline"><div>{{{{<ins class="diffchange diffchange-inline">{template}</ins> article}}}}'
-        pat3 = f'</a>{{{{<ins class="diffchange diffchange-inline">{template}</ins> article}}}}'
-        pat4 = f'</a>{{{{<del class="diffchange diffchange-inline">{template}</del> article}}}}'
-        pat5 = f'{{{{{template} article}}}}'
-        pat6 = f'</a>{{{{{template} article}}}}'
-        pat7 = f'<td class="diff-addedline"><div>{{{{<ins class="diffchange diffchange-inline">{template}</ins>'
-        pat8 = f'<td class="diff-deletedline"><div>{{{{<del class="diffchange diffchange-inline">{template}</del>'
-        pat9 = f'<td class="diff-addedline"><div>{{{{{template}'
-        pat10 = f'<td class="diff-deletedline"><div>{{{{{template}'
-        bool_missing = (pat1 in html_content) | (pat2 in html_content) | (pat3 in html_content) | (pat4 in html_content) | (pat5 in html_content) | (pat6 in html_content) | (pat7 in html_content) | (pat8 in html_content) | (pat9 in html_content) | (pat10 in html_content)
+        captured = set()
+        for match in TEMPLATE_DIFF_PATTERN.finditer(html_content):
+            prefix, line, tag, name, rest = [(group or "").lower() for group in match.groups()]
+            
+            for template in self.tl:
+                if tag == "":
+                    in_diff = (rest.startswith(f"{template} article}}}}") or
+                               (line != "" and rest.startswith(template)))
+                else:
+                    in_diff = (name == template) and (((line, tag) in (("added", "ins"), ("deleted", "del"))) or
+                                                      (prefix == "</a>" and rest.startswith(" article}}")))
+                if in_diff:
+                    captured.add(template)
 
-        return int(bool_missing)
+        return captured
     
     
     def get_missing_tl(self, sus):
@@ -715,23 +585,17 @@ class TemplateListener():
         """
         # Find previous rev_id.
         sus_rev_id = sus["rev_id"].unique()
+        prev_ids = dict(zip(sus_rev_id, self._get_prev_rev(sus_rev_id)))
         
-        self.token_rev_ids = self.df.sort_values("rev_time").reset_index(drop=True)["rev_id"].unique()
-        prev_ids = {key: self._get_prev_rev(key) for key in sus_rev_id}
-        
-        # Retrieve revision changes in form of HTML.
-        diff_response = {}
-        for cur, prev in tqdm(prev_ids.items()):
-            diff_response[cur] = self.api.get_talk_rev_diff(cur, prev)["*"]
+        # Retrieve revision changes in form of HTML, concurrently and only once per pair.
+        diffs = self.api.get_talk_rev_diffs(list(prev_ids.items()))
         
-        # Mark missing status.
-        sus["missing"] = 0
-        for sus_row in sus.iterrows():
-            content = diff_response[sus_row[1]["rev_id"]]
-            tl_token = sus_row[1]["token"]
-            sus.loc[sus_row[0], "missing"] = self._template_capturer(content, tl_token)
+        # Mark missing status, scanning each diff once.
+        captured = [(cur, template) for cur, prev in prev_ids.items()
+                    for template in self._template_capturer(diffs[(cur, prev)]["*"])]
+        mask_missing = pd.MultiIndex.from_arrays([sus["rev_id"], sus["token"]]).isin(captured)
             
-        missing = sus[sus["missing"] == 1].drop("missing", axis=1)
+        missing = sus[mask_missing]
         
         return missing
     
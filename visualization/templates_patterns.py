@@ -0,0 +1,13 @@
+import re
+
+
+# Protection entries, like "[edit=autoconfirmed] (indefinite)" or a trailing "[edit=sysop:move=sysop]".
+PROTECT_PAIRS_PATTERN = re.compile(r'\[(.*?)\]\ \((.*?)\)')
+PROTECT_TRAILING_PATTERN = re.compile(r'\[(.*?)\]$')
+
+# HTML diff around a '{{': what precedes it, the side of the diff line it starts, and the
+# template name with the rest of the text, see TemplateListener._template_capturer(). The
+# pattern is a lookahead so the matches overlap: in '{{{featured article}}' both '{{' are tried.
+TEMPLATE_DIFF_PATTERN = re.compile(r'(?=(<td class="diff-(added|deleted)line"><div>|</a>)?'
+                                   r'\{\{(?:<(ins|del) class="diffchange diffchange-inline">([^<]*)</\3>)?'
+                                   r'([^<{]*))', re.IGNORECASE)
@@ -14,6 +14,7 @@ import plotly.graph_objects as go
 
 from metrics.token import TokensManager
 from metrics.conflict import ConflictManager
+from metrics.ownership import OwnershipManager
 
 
 class TokensListener():
@@ -24,6 +25,7 @@ class TokensListener():
         self.sources = sources
         self.lng = lng
         self.page_title = sources["tokens_all"]["article_title"].unique()[0]
+        self.token_tables = {"Not included": None, "Included": None}
         
     def get_columns(self):
         #create columns 'time_diff' (Time in sec between this action and the last action on the token)
@@ -76,30 +78,70 @@ class TokensListener():
             print('Link to the wikipedia diff: ')
             print(url)
         
-    def listen(self, revid, stopwords):
-        # Get source data through ConflictManager. 
-        if stopwords == 'Not included':
-            link_token = remove_stopwords(self.sources["tokens_all"], self.lng)
-            self.token_source = link_token
-            del link_token
-        else:
-            link_token = self.sources["tokens_all"]
-            self.token_source = link_token
-            del link_token
+    def get_token_table(self, stopwords):
+        """
+        Augmented token table (oadd actions, editor names, time_diff and reverted_editor)
+        sorted by token_id and rev_time, built once per stopwords mode, with the indices to
+        find the histories of the tokens of a revision:
+        revs / rev_offsets / rev_token_ids: the token ids of each revision are
+                rev_token_ids[rev_offsets[i]:rev_offsets[i + 1]] for the i-th rev id in revs.
+        tokens / token_offsets: the rows of the i-th token id of tokens are
+                table[token_offsets[i]:token_offsets[i + 1]].
+        """
+        if self.token_tables[stopwords] is None:
+            # Get source data through ConflictManager. 
+            if stopwords == 'Not included':
+                self.token_source = remove_stopwords(self.sources["tokens_all"], self.lng)
+            else:
+                self.token_source = self.sources["tokens_all"]
+            self.token_source = self.token_source.reset_index(drop=True)
+            
+            #add necessary columns and process the dataframe (sorted by token_id and rev_time):
+            self.convert_oadd()
+            self.get_editor_names()
+            self.get_columns()
+            table = self.token_source.reset_index(drop=True)
+            
+            #token ids of every revision
+            rev_order = np.argsort(table['rev_id'].values, kind='mergesort')
+            revs, rev_starts = np.unique(table['rev_id'].values[rev_order], return_index=True)
+            
+            #rows of every token
+            tokens, token_starts = np.unique(table['token_id'].values, return_index=True)
+            
+            self.token_tables[stopwords] = {'table': table,
+                                            'revs': pd.Index(revs),
+                                            'rev_offsets': np.append(rev_starts, len(table)),
+                                            'rev_token_ids': table['token_id'].values[rev_order],
+                                            'tokens': tokens,
+                                            'token_offsets': np.append(token_starts, len(table))}
         
-        self.token_source = self.token_source.reset_index(drop=True)
+        return self.token_tables[stopwords]
+        
+    def listen(self, revid, stopwords):
+        token_table = self.get_token_table(stopwords)
+        self.token_source = token_table['table']
 
         #selected revision id:
         #self.rev_id = int(rev_id)
         
         #extract editor name and timestamp to display before the table
         self.rev_id = revid
-        self.filtered_df = self.token_source[self.token_source['rev_id']==self.rev_id]
-        if len(self.filtered_df) != 0:
-            editor_name = self.editors.loc[self.editors['editor_id'] == self.filtered_df['editor'].values[0], 'name'].values[0]
-        else:
+        rev_idx = token_table['revs'].get_indexer([self.rev_id])[0]
+        if rev_idx == -1:
             return display(md("No tokens in this revision!"))
-        timestamp = pd.DatetimeIndex(self.token_source[self.token_source['rev_id']==self.rev_id]['rev_time'])[0]
+        
+        #get tokens from the selected revision, and their rows (from previous and future revisions as well):
+        rev_tokens = token_table['rev_token_ids'][token_table['rev_offsets'][rev_idx]:token_table['rev_offsets'][rev_idx + 1]]
+        token_idx = np.searchsorted(token_table['tokens'], rev_tokens)
+        starts, ends = token_table['token_offsets'][token_idx], token_table['token_offsets'][token_idx + 1]
+        lengths = ends - starts
+        rows = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        token_rows = self.token_source.iloc[rows]
+        
+        self.filtered_df = token_rows[token_rows['rev_id'] == self.rev_id]
+        editor_name = self.filtered_df['name'].values[0]
+        timestamp = pd.DatetimeIndex(self.filtered_df['rev_time'])[0]
         display(md(f"***Selected revision: ID: {self.rev_id}, editor name: {str(editor_name)}, timestamp: {str(timestamp.date())} {str(timestamp.time())}***"))
                    
         # Print URL to wikipedia diff.
@@ -107,18 +149,8 @@ class TokensListener():
         display(HTML(f'<a href="{url}" target="_blank">Click here to see the Wikipedia Text DIFF</a>'))
             
         if  self.rev_id != None:
-            #add necessary columns and process the dataframe:
-            self.convert_oadd()
-            self.get_editor_names()
-            self.get_columns()
             #self.token_source['time_diff'] = self.token_source['time_diff'].apply(lambda x: TokensListener.convert_time_diff(x))
-            
-            #sort the dataframe by timestamp and token_id:
-            self.token_source.sort_values(['rev_time', 'token_id'], ascending = True, inplace=True)
-                   
-            #get tokens from the selected revision (from previous and future revisions as well):
-            rev_tokens = self.token_source.loc[self.token_source['rev_id'] == self.rev_id, 'token_id'].values
-            tokens_for_grid = self.token_source.loc[self.token_source['token_id'].isin(rev_tokens), ['token', 'token_id', 'action', 'rev_id', 'rev_time', 'name', 'o_rev_id', 'reverted_editor', 'time_diff' ]].rename(columns={'token': 'string', 'name': 'editor'})
+            tokens_for_grid = token_rows[['token', 'token_id', 'action', 'rev_id', 'rev_time', 'name', 'o_rev_id', 'reverted_editor', 'time_diff' ]].rename(columns={'token': 'string', 'name': 'editor'})
             
             #convert the format of columns to display:
             tokens_for_grid['rev_id'] = tokens_for_grid['rev_id'].astype(int).astype(str)
@@ -161,8 +193,7 @@ class TokensOwnedListener():
 #         self.token_source = self.token_source.rename(columns={"editor":'editor_id'})
         self.editors['o_editor'] = self.editors['editor_id'].astype(str)
         self.token_source['o_editor'] = self.token_source['o_editor'].astype(str)
-        tokens_merged = self.editors[['o_editor', 'name']].merge(self.token_source, on='o_editor', how='outer')
-        self.token_source = tokens_merged[tokens_merged['token'].notnull()].copy()
+        self.names = dict(zip(self.editors['o_editor'], self.editors['name']))
         
         
     def listen(self,_range1, _range2, stopwords, granularity):
@@ -194,15 +225,12 @@ class TokensOwnedListener():
 
         if len(days) > 0:
             days = days.dt.to_timestamp(granularity[0]) + pd.DateOffset(1) #converting and adding one day for extracting previous dates from dataframe
-            self.summ = pd.DataFrame(columns=['name', 'action', 'rev_time'])
-            _abs = []
-            df = self.token_source
-            for rev_time in days:
-                df = df[df['rev_time'] <= rev_time]
-                last_action = df.groupby('token_id').last() #last of group values for each token id
-                surv = last_action[last_action['action'] != 'out'].groupby('name')['action'].agg('count').reset_index()
-                surv['rev_time'] = rev_time - pd.DateOffset(1)
-                self.summ = self.summ.append(surv)
+            
+            #tokens owned by every editor at every date, in one pass over the actions
+            history = OwnershipManager(self.token_source).get_owned_history(days.values, owners=self.names)
+            history['rev_time'] = history['rev_time'] - pd.DateOffset(1)
+            self.summ = history.rename(columns={'owner': 'name', 'owned': 'action'}
+                                      ).sort_values('rev_time', ascending=False, kind='mergesort')[['name', 'action', 'rev_time']]
 
             #getting top editors among the token owners over all time
             top_editors = self.summ.groupby('name')['action'].agg('sum').sort_values(ascending=False).reset_index()[:15]
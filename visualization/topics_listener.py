@@ -1,4 +1,5 @@
 #import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import plotly
 #import plotly.plotly as py
@@ -8,6 +9,14 @@ from external.wikipedia import WikipediaDV, WikipediaAPI
 #from wordcloud import WordCloud
 
 
+#comments of section edits, like '/* topic */ comment'
+SECTION_PATTERN = re.compile(r'\/\*\s(?:.+?)\s\*\/')
+EMAIL_SECTION_PATTERN = re.compile(r'\/\*\s(?:.+?@.+?)\s\*\/')
+TOPIC_PATTERN = re.compile(r'\/\*(.+?)\*\/')
+#section headings in diffs, like '== topic =='
+HEADING_PATTERN = re.compile(r'==(.+?)==')
+
+
 class TopicsListener():
 
     def __init__(self, df):
@@ -15,31 +24,26 @@ class TopicsListener():
         self.df_plotted = None
         
     
-    def find_topic(self,comment):
-        if re.search('\/\*\s(.+?)\s\*\/', comment) and 'Signing' not in comment:
-            if not re.search('\/\*\s(.+?@.+?)\s\*\/', comment):
-                return (re.search('\/\*(.+?)\*\/', comment).group(1))
-        else:
-            pass
+    def find_topic(self, comments):
+        #section edited, like '/* topic */ comment', except signings and e-mails
+        mask_section = comments.str.contains(SECTION_PATTERN).fillna(False)
+        mask_signing = comments.str.contains('Signing', regex=False).fillna(False)
+        mask_email = comments.str.contains(EMAIL_SECTION_PATTERN).fillna(False)
+        topics = comments.str.extract(TOPIC_PATTERN, expand=False)
+        
+        return topics.where(mask_section & ~mask_signing & ~mask_email)
     
     #extracting a type of comment (new section added, revision deleted, section edited etc.)    
     def get_action_type(self):
-        self.talk_content = self.talk_content[::-1].reset_index()
-        self.talk_content['action_type'] = None
-        for i, row in self.talk_content.iterrows():
-            #checking if the rows before have this topic
-            if row['topics'] in list(self.talk_content.topics[:i]):
-                self.talk_content.loc[i, ['action_type']] = 'edit'
-            #no rows found, means it's new
-            else:
-                self.talk_content.loc[i, ['action_type']] = 'new'
-        self.talk_content = self.talk_content[::-1].reset_index()
+        self.talk_content = self.talk_content.reset_index(drop=True)
+        #revisions go from the newest to the oldest, a topic is new in its oldest revision
+        self.talk_content['action_type'] = np.where(self.talk_content['topics'].duplicated(keep='last'), 'edit', 'new')
         
 
     #extract topics and action_types
     def extract_topics(self, wikipediadv_ins):
         self.talk_content = self.df
-        self.talk_content['topics'] = self.talk_content.comment.apply(lambda x: self.find_topic(x) if not pd.isna(x) else None)
+        self.talk_content['topics'] = self.find_topic(self.talk_content['comment'])
         self.extract_null_content(wikipediadv_ins)
         self.get_action_type()
         
@@ -49,13 +53,6 @@ class TopicsListener():
        
         tp = self.talk_content[self.talk_content['topics'].isin(topics.index[topics==1])]
         self.test_tp = tp
-        for i, row in tp.iterrows():
-            if i!= len(self.talk_content)-1:
-                next_comment = self.talk_content.loc[i+1, 'comment']
-                regex = re.compile('\w*revert|removed|Remove|rvv|zurückgesetzt\w*')
-                if type(next_comment) == str:
-                    if regex.search(next_comment):
-                        self.talk_content.drop(i)
         self.df = self.talk_content
 
         #keeping only necessary columns for display
@@ -65,27 +62,25 @@ class TopicsListener():
     
     #for those revisions that have null comment, we extract diff using wikipedia api
     def extract_null_content(self, wikipediadv_ins):
-        # setting empty dataframe
-        self.talk_diff = pd.DataFrame(columns=['fromid', 'fromrevid', 'fromns', 'fromtitle', 'toid', 'torevid', 'tons', 'totitle', 'content'])
-
-        null_topic = self.talk_content[self.talk_content['comment']==""]
-        #iterrating over empty revision content
-        for i, row in null_topic.iterrows():
-            torev = row['revid']
-            if i == len(self.talk_content) - 1:
-                pass
-            else:
-                fromrev = self.talk_content.iloc[i+1]['revid']
-                #appending diff content
-                self.talk_diff = self.talk_diff.append(wikipediadv_ins.get_talk_rev_diff(fromrev=fromrev, torev=torev), ignore_index=True)
+        #revisions go from the newest to the oldest, the diff is taken from the next row
+        #the index repeats when the talk content was appended batch by batch, so select by mask
+        prev_revid = self.talk_content['revid'].shift(-1)
+        mask_null = ((self.talk_content['comment'] == "") & prev_revid.notnull()).values
+        rev_pairs = list(zip(prev_revid[mask_null].astype(int), self.talk_content.loc[mask_null, 'revid']))
         
+        #retrieving all diffs at once, concurrently and cached by revision pair
+        diffs = wikipediadv_ins.get_talk_rev_diffs(rev_pairs)
+        diff_columns = ['fromid', 'fromrevid', 'fromns', 'fromtitle', 'toid', 'torevid', 'tons', 'totitle', '*']
+        self.talk_diff = pd.DataFrame({col: [diffs[pair].get(col) for pair in rev_pairs] for col in diff_columns})
+        self.talk_diff['torevid'] = [torev for _, torev in rev_pairs]
         self.talk_diff = self.talk_diff.rename(columns={"*":"comment"})
-        if len(self.talk_diff) > 0:
-        #iterrating over comments 
-            for comment in self.talk_diff['comment']:
-                if re.search('==(.+?)==', comment):
-                    rev_id = self.talk_diff.loc[self.talk_diff['comment']==comment,'torevid']
-                    self.talk_content.loc[self.talk_content['revid']==int(rev_id), 'topics'] = re.search('==(.+?)==', comment).group(0)[2:-2]
+        
+        #section headings of the diffs, set as topics of their revisions
+        headings = self.talk_diff['comment'].str.extract(HEADING_PATTERN, expand=False)
+        headings = pd.Series(headings.values, index=self.talk_diff['torevid']).dropna()
+        headings = headings[~headings.index.duplicated(keep='last')]
+        mask_heading = self.talk_content['revid'].isin(headings.index).values
+        self.talk_content.loc[mask_heading, 'topics'] = self.talk_content.loc[mask_heading, 'revid'].map(headings).values
                     
     def translusion(self, wikipedia_dv):
     #adding content from transcluded page
@@ -1,5 +1,6 @@
 import copy
 import qgrid
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
@@ -93,13 +94,39 @@ class WCActionsListener():
             dict "tokens_inc_stop" (adds/dels/reins with survival states from TokensManager)
     max_words (int): displaying top max_words frequently changed words. 100 by default.
     lng (str): {'en', 'de'}
+    token_index (dict): inverted index from strings to rows of "tokens_all", see _get_token_index().
     _
     """
     def __init__(self, sources, lng, max_words=100):
         self.max_words = max_words
         self.sources = sources
         self.lng=lng
+        self.token_index = None
         
+    def _get_token_index(self):
+        """
+        Called in _select_token(). Inverted index from strings to their rows in "tokens_all",
+        built once: the rows are sorted by string code and day, so the rows of each string
+        are a contiguous block (starting at its offset) in time order.
+        ...
+        Returns:
+        -----------
+        token_index (dict): strings (pd.Index), rows (row positions), days (day of each row,
+                as int64) and offsets (start of each string's block, plus the end).
+        """
+        token_source = self.sources["tokens_source"]["tokens_all"]
+        rev_time = token_source['rev_time']
+        if rev_time.dt.tz is not None:
+            rev_time = rev_time.dt.tz_localize(None)
+        days = rev_time.dt.floor('D').values.view('int64')
+        
+        codes, strings = pd.factorize(token_source['token'])
+        rows = np.lexsort((days, codes))
+        offsets = np.searchsorted(codes[rows], np.arange(len(strings) + 1))
+        
+        return {'strings': strings, 'rows': rows, 'days': days[rows], 'offsets': offsets}
+        
+    
     def _select_token(self, string, range1, range2):
         """
         Called in token_selection_change(). Get string's editing history under
@@ -115,11 +142,21 @@ class WCActionsListener():
         -----------
         pd.DataFrame displaying string's history
         """
-        token_source = self.sources["tokens_source"]["tokens_all"]          
-        ranged_token = token_source[(token_source['rev_time'].dt.date >= range1)\
-                          & (token_source['rev_time'].dt.date <= range2)]
+        token_source = self.sources["tokens_source"]["tokens_all"]
+        if self.token_index is None:
+            self.token_index = self._get_token_index()
+        
+        code = self.token_index['strings'].get_indexer([string])[0]
+        if code == -1:
+            return token_source.iloc[:0]
         
-        return ranged_token[ranged_token['token'] == string]
+        # Block of the string, then the days in range within it.
+        start, end = self.token_index['offsets'][code], self.token_index['offsets'][code + 1]
+        days = self.token_index['days'][start:end]
+        first = start + np.searchsorted(days, np.datetime64(range1, 'ns').astype('int64'), side='left')
+        last = start + np.searchsorted(days, np.datetime64(range2, 'ns').astype('int64'), side='right')
+        
+        return token_source.iloc[np.sort(self.token_index['rows'][first:last])]
             
         
                         
@@ -213,14 +250,12 @@ class WCActionsListener():
         wc = WordClouder(df, colors, 5000)
 
         try:
-            wcr = wc.get_wordcloud()
+            # Large vocabularies, show a preview while the full cloud is laid out.
+            wcr = wc.get_progressive()
             display(md(f"**Only top {self.max_words} most frequent words displayed.**"))
 
             # Plot
-            plt.figure(figsize=(14, 7))
-            plt.imshow(wcr, interpolation="bilinear")
-            plt.axis("off")
-            plt.show()
+            display(wcr)
 
         except ValueError:
             display(
@@ -1,4 +1,13 @@
+import asyncio
+import hashlib
+import io
 import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from PIL import Image as PILImage
+from IPython.display import Markdown as md
+from ipywidgets import Image, Layout, Output, VBox
 from wordcloud import WordCloud as WC
 
 from multidict import MultiDict
@@ -6,6 +15,11 @@ from multidict import MultiDict
 
 class WordCloud(WC):
 
+    def generate_from_frequencies(self, frequencies, max_font_size=None):
+        # A new layout needs a new image.
+        self.array_ = None
+        return super().generate_from_frequencies(frequencies, max_font_size=max_font_size)
+
     def recolor(self, random_state=None, color_func=None, colormap=None):
         if isinstance(random_state, (int, np.integer)):
             random_state = Random(random_state)
@@ -27,29 +41,106 @@ class WordCloud(WC):
                                     font_path=self.font_path))
                         for word_freq, font_size, position, orientation, _
                         in self.layout_]
+        self.array_ = None
 
         return self
 
+    def to_array(self):
+        # The image is drawn once per layout and reused afterwards.
+        if getattr(self, 'array_', None) is None:
+            self.array_ = super().to_array()
+
+        return self.array_
+
 
 class WordClouder(object):
 
+    # Word clouds already laid out, by digest of the words and colors and by canvas (least
+    # recently used first). The cache is shared by all the clouds of the session, whatever the
+    # page, and bounded: at most max_cached clouds are kept, each with its image (about 1 MB
+    # for a full size cloud).
+    cache = OrderedDict()
+    max_cached = 16
+    cache_lock = Lock()
+
+    # Full resolution clouds are laid out one at a time, off the kernel thread.
+    executor = ThreadPoolExecutor(max_workers=1)
+
     def __init__(self, words, colors, max_words):
         self.words = words
         self.colors = colors
         self.max_words = max_words
+        self.digest = None
 
     def get_color_func(self, word, **args):
         return self.colors[word[-1]]
 
-    def get_wordcloud(self):
+    def _get_key(self, width, height, max_words):
+        # The words are hashed once per cloud; SHA-256 keeps clouds with different words apart.
+        if self.digest is None:
+            words = [(word, float(weight)) for word, weight in self.words.items()]
+            content = repr((words, sorted(self.colors.items())))
+            self.digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+        return (self.digest, width, height, max_words)
+
+    def get_wordcloud(self, scale=1, max_words=None):
         #alice_mask = np.array(Image.open("alice_mask.png"))
+        width, height = int(800 * scale), int(400 * scale)
+        if max_words is None:
+            max_words = self.max_words
+
+        # Same words on the same canvas, reuse the layout and its image.
+        key = self._get_key(width, height, max_words)
+        with WordClouder.cache_lock:
+            if key in WordClouder.cache:
+                WordClouder.cache.move_to_end(key)
+                return WordClouder.cache[key]
 
-        wc = WordCloud(background_color="white", width=800, height=400, max_words=self.max_words)
+        wc = WordCloud(background_color="white", width=width, height=height, max_words=max_words)
 
         # generate word cloud
         wc.generate_from_frequencies(self.words)
 
         # color the wordclound
         wc.recolor(color_func=self.get_color_func)
+        wc.to_array()
+
+        with WordClouder.cache_lock:
+            WordClouder.cache[key] = wc
+            if len(WordClouder.cache) > WordClouder.max_cached:
+                WordClouder.cache.popitem(last=False)
 
         return wc
+
+    def _to_png(self, wc):
+        png = io.BytesIO()
+        PILImage.fromarray(wc.to_array()).save(png, format='PNG')
+
+        return png.getvalue()
+
+    def _get_png(self):
+        return self._to_png(self.get_wordcloud())
+
+    def _swap_wordcloud(self, future, image, errors):
+        # Called on the event loop of the kernel, which owns the widgets.
+        try:
+            image.value = future.result()
+        except Exception as e:
+            errors.append_display_data(md(f"**The full size word cloud could not be created: {e}**"))
+
+    def get_progressive(self, scale=0.25, preview_words=200):
+        """
+        Widget that shows a downscaled word cloud (a quarter of the canvas and at most
+        preview_words words) right away. The full resolution cloud is laid out in the
+        executor and swapped into the image when it is ready; if it fails, the preview stays
+        and the error is shown under it.
+        """
+        preview = self.get_wordcloud(scale=scale, max_words=min(self.max_words, preview_words))
+        image = Image(value=self._to_png(preview), format='png', layout=Layout(width='100%'))
+        errors = Output()
+
+        future = asyncio.get_event_loop().run_in_executor(WordClouder.executor, self._get_png)
+        future.add_done_callback(lambda future: self._swap_wordcloud(future, image, errors))
+
+        return VBox([image, errors])